@@ -10,14 +10,82 @@
 # PURPOSE.
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
+import time
+import threading
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
-from retrying import retry, RetryError
+from retrying import Attempt, RetryError
 import constant
+from api.backoff import Backoff, RETRYABLE_EXCEPTIONS, retry_after, retryable_status
+from api.cache import CacheEntry, ResponseCache
+from api.control import SingleFlight, TokenBucket, CircuitBreaker
+from conf import config
 from logger import logger
 
 
 class Api:
+    # Keep-alive sessions shared by the whole process, one per host and credentials
+    _sessions = dict()
+    _sessions_lock = threading.Lock()
+    # Cache of GET responses, see Api._response_cache
+    _cache = None
+    _cache_lock = threading.Lock()
+    # Identical GETs in flight, see Api._request
+    _flights = SingleFlight()
+    # Rate limiters and circuit breakers of each host, see Api._host_control
+    _limiters = dict()
+    _breakers = dict()
+    _hosts_lock = threading.Lock()
+
+    @staticmethod
+    def _session(url, auth=None):
+        """
+        Pooled keep-alive session of the host of the url,
+        the authentication is attached to the session once
+        """
+        parsed_url = urlsplit(url)
+        key = (
+            parsed_url.scheme,
+            parsed_url.netloc,
+            getattr(auth, "username", None),
+            getattr(auth, "password", None),
+        )
+        with Api._sessions_lock:
+            session = Api._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=4, pool_maxsize=config.http_pool_maxsize
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.auth = auth
+                Api._sessions[key] = session
+        return session
+
+    @staticmethod
+    def _host_control(url):
+        """
+        Rate limiter and circuit breaker of the host of the url,
+        the limiter is None when config.http_rate_limits has no entry for the host
+        """
+        host = urlsplit(url).hostname
+        with Api._hosts_lock:
+            if host not in Api._breakers:
+                limit = (config.http_rate_limits or dict()).get(host)
+                if isinstance(limit, dict):
+                    Api._limiters[host] = TokenBucket(**limit)
+                else:
+                    Api._limiters[host] = TokenBucket(limit) if limit else None
+                breaker = config.http_circuit_breaker or dict()
+                Api._breakers[host] = CircuitBreaker(
+                    threshold=breaker.get("threshold", 5),
+                    cooldown=breaker.get("cooldown", 60),
+                )
+            return Api._limiters[host], Api._breakers[host]
+
     @staticmethod
     def _post(url, data, text=False, **kwargs):
         """
@@ -52,12 +120,16 @@ class Api:
             return None
 
     @staticmethod
-    def _get(url, level="warning", params=None, text=False, **kwargs):
+    def _get(url, level="warning", params=None, text=False, cache=None, **kwargs):
         """
         HTTP GET request
+        :param cache: name of the endpoint in config.http_cache_ttl, the response is cached
+                      and revalidated with If-None-Match/If-Modified-Since once its ttl expires
         """
         try:
-            return Api._request(level=level, url=url, method="get", data=params, text=text, **kwargs)
+            return Api._request(
+                level=level, url=url, method="get", data=params, text=text, cache=cache, **kwargs
+            )
         except RetryError:
             logger.warning(f"Request get error: {url}")
             return None
@@ -74,35 +146,125 @@ class Api:
             return None
 
     @staticmethod
-    @retry(
-        retry_on_result=lambda result: result is None,
-        stop_max_attempt_number=constant.STOP_MAX_ATTEMPT_NUMBER,
-        wait_fixed=constant.WAIT_FIXED,
-    )
-    def _request(url, method="get", data=None, text=False, level="warning", **kwargs):
+    def _response_cache():
         """
-        POST into gitee API
+        Response cache shared by the whole process
+        """
+        with Api._cache_lock:
+            if Api._cache is None:
+                Api._cache = ResponseCache(
+                    max_entries=config.http_cache_size,
+                    directory=constant.HTTP_CACHE_PATH if config.http_cache_disk else None,
+                )
+        return Api._cache
+
+    @staticmethod
+    def _request(url, method="get", data=None, text=False, level="warning", cache=None, **kwargs):
+        """
+        Request the url and decode the response, cacheable GET responses are served
+        from the response cache while fresh and revalidated once stale.
+        Identical GETs in flight at the same time share a single request,
+        GETs asking for other headers (e.g. a Range) or a streamed body are not shared
         """
         if data:
             if method == "get":
                 kwargs["params"] = data
             else:
                 kwargs["data"] = data
-        try:
-            if "timeout" not in kwargs:
-                kwargs["timeout"] = 30
-            response = requests.request(method=method, url=url, verify=False, **kwargs)
-        except RequestException as error:
-            logger.error(f"Call url {url} failed, message: {error}")
-            return None
+        if "timeout" not in kwargs:
+            kwargs["timeout"] = 30
+        # A streamed body can only be read by one caller
+        if method != "get" or kwargs.get("stream"):
+            return Api._perform(url, method, text, level, cache, **kwargs)
+        flight_key = SingleFlight.key(
+            method,
+            url,
+            kwargs.get("params"),
+            text,
+            getattr(kwargs.get("auth"), "username", None),
+            SingleFlight.headers_key(kwargs.get("headers")),
+        )
+        return Api._flights.do(flight_key, Api._perform, url, method, text, level, cache, **kwargs)
+
+    @staticmethod
+    def _perform(url, method, text=False, level="warning", cache=None, **kwargs):
+        """
+        Perform the request and decode the response
+        """
+        response_cache, key, entry = Api._response_cache(), None, None
+        if cache and method == "get":
+            key = ResponseCache.key(url, kwargs.get("params"), kwargs.get("auth"))
+            entry = response_cache.get(key)
+            if entry is not None:
+                if entry.fresh((config.http_cache_ttl or dict()).get(cache, 0)):
+                    return entry.content(text)
+                kwargs["headers"] = dict(kwargs.get("headers") or dict(), **entry.validators())
+        response = Api._send(url, method, level, **kwargs)
+        if not isinstance(response, requests.Response):
+            return response
+        if response.status_code == requests.codes.not_modified and entry is not None:
+            response_cache.refresh(key, entry)
+            return entry.content(text)
+        if method != "get":
+            response_cache.invalidate(url)
+        if response.status_code == requests.codes.no_content:
+            return dict(delete="success")
+        if key is not None:
+            response_cache.put(key, CacheEntry.from_response(url, response))
+        return response.text if text else response.json()
+
+    @staticmethod
+    def _send(url, method, level="warning", **kwargs):
+        """
+        Send the request, transient failures (connect errors, 5xx and 429) are retried
+        with exponential backoff and full jitter, honouring the wait the server asks for
+        :return: the successful response, None or False (404) when the request failed
+        """
+        session = Api._session(url, auth=kwargs.pop("auth", None))
         success_code = (
             requests.codes.ok,
             requests.codes.created,
             requests.codes.no_content,
+            requests.codes.partial_content,
+            requests.codes.not_modified,
         )
-        if response.status_code not in success_code:
-            getattr(logger, level)(f"reuqest url: {url} status code: {response.status_code}")
-            return None if response.status_code != requests.codes.not_found else False
-        if response.status_code == requests.codes.no_content:
-            return dict(delete="success")
-        return response.text if text else response.json()
+        limiter, breaker = Api._host_control(url)
+        backoff = Backoff()
+        for attempt in range(1, constant.STOP_MAX_ATTEMPT_NUMBER + 1):
+            if limiter is not None:
+                limiter.acquire()
+            if not breaker.allow():
+                logger.warning(f"Circuit of {urlsplit(url).hostname} is open, skip url {url}")
+                raise RetryError(Attempt(None, attempt, False))
+            wait = None
+            try:
+                # verify on the session would be overridden by REQUESTS_CA_BUNDLE
+                response = session.request(method=method, url=url, verify=False, **kwargs)
+            except RETRYABLE_EXCEPTIONS as error:
+                logger.error(f"Call url {url} failed, message: {error}")
+                breaker.failure()
+            except RequestException as error:
+                logger.error(f"Call url {url} failed, message: {error}")
+                breaker.success()
+                return None
+            except BaseException:
+                # The outcome is unknown, count it as a failure so that a
+                # half-open probe does not stay in flight forever
+                breaker.failure()
+                raise
+            else:
+                if response.status_code < requests.codes.internal_server_error:
+                    breaker.success()
+                else:
+                    breaker.failure()
+                if response.status_code in success_code:
+                    return response
+                getattr(logger, level)(f"reuqest url: {url} status code: {response.status_code}")
+                if not retryable_status(response.status_code):
+                    return None if response.status_code != requests.codes.not_found else False
+                wait = retry_after(response)
+            if attempt < constant.STOP_MAX_ATTEMPT_NUMBER:
+                delay = backoff.delay(attempt, wait)
+                logger.info(f"Retry url {url} in {delay:.2f}s, attempt {attempt + 1}")
+                time.sleep(delay)
+        raise RetryError(Attempt(None, constant.STOP_MAX_ATTEMPT_NUMBER, False))
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2021. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+import time
+import random
+from email.utils import parsedate_to_datetime
+import requests
+from requests.exceptions import ConnectionError, Timeout, ChunkedEncodingError
+import constant
+
+# Failures of the transport which are worth another attempt
+RETRYABLE_EXCEPTIONS = (ConnectionError, Timeout, ChunkedEncodingError)
+
+# Epoch seconds are told apart from a delta seconds rate limit reset with this bound
+_EPOCH_THRESHOLD = 10 ** 9
+
+
+class Backoff:
+    """
+    Exponential backoff with full jitter, the n-th wait is drawn
+    uniformly from [0, min(cap, base * 2 ** (n - 1))] seconds
+    """
+
+    def __init__(self, base=None, cap=None):
+        self.base = constant.RETRY_BACKOFF_BASE if base is None else base
+        self.cap = constant.RETRY_BACKOFF_MAX if cap is None else cap
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Seconds to wait after the failed attempt
+        :param attempt: number of the failed attempt, starting at 1
+        :param retry_after: seconds the server asked to wait, it takes precedence
+        """
+        if retry_after is not None:
+            return min(max(retry_after, 0), constant.RETRY_AFTER_MAX)
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+    def __call__(self, attempt_number, delay_since_first_attempt_ms=None):
+        """
+        Wait function of retrying, in milliseconds
+        """
+        return self.delay(attempt_number) * 1000
+
+
+def retryable_status(status_code):
+    """
+    Server errors and rate limiting are transient, other client errors are not
+    """
+    return (
+        status_code >= requests.codes.internal_server_error
+        or status_code == requests.codes.too_many_requests
+    )
+
+
+def retry_after(response):
+    """
+    Seconds the server asked to wait before the next request,
+    from the Retry-After or X-RateLimit-* headers
+    :param response: response of the failed request
+    :return: seconds or None when the server did not say
+    """
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+    if response.headers.get("X-RateLimit-Remaining") != "0":
+        return None
+    reset = response.headers.get("X-RateLimit-Reset")
+    try:
+        reset = float(reset)
+    except (TypeError, ValueError):
+        return None
+    return reset - time.time() if reset > _EPOCH_THRESHOLD else reset
@@ -10,15 +10,24 @@
 # PURPOSE.
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
+import io
+import re
+import time
+import threading
+from xml.etree import ElementTree
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
 
 import xmltodict
+import constant
 from conf import config
 from logger import logger
 from requests.auth import HTTPBasicAuth
+from requests.exceptions import ReadTimeout, RequestException
 
 from . import Api
+from .download import BinaryDownloader
+from .rpm_cache import RpmCache
 
 
 class BuildABC(Api):
@@ -78,6 +87,16 @@ class BuildABC(Api):
         """Gets the rpm packages generated by a particular repo"""
         pass
 
+    @abstractmethod
+    def package_binarys(self, project, package, repository="standard_x86_64", arch="x86_64"):
+        """the installable rpm packages generated by a package"""
+        pass
+
+    @abstractmethod
+    def download_binarys(self, binarys, directory):
+        """download binary packages"""
+        pass
+
     @abstractmethod
     def published_binarys(self, project, repository="standard_x86_64", arch="x86_64"):
         """all archived binary packages under the published project"""
@@ -97,6 +116,16 @@ class BuildABC(Api):
         """Gets the compile status of the last package"""
         pass
 
+    @abstractmethod
+    def tail_build_log(self, project, package, arch, size=None, last=True):
+        """get the end of a package build log"""
+        pass
+
+    @abstractmethod
+    def follow_build_log(self, project, package, arch, offset=0):
+        """follow a package build log as it grows"""
+        pass
+
     @abstractmethod
     def get_package_meta(self, level, project, package):
         """get package meta"""
@@ -112,11 +141,21 @@ class BuildABC(Api):
         """get project build state"""
         pass
 
+    @abstractmethod
+    def watch_project_build_state(self, project):
+        """watch the build state changes of the project packages"""
+        pass
+
     @abstractmethod
     def package_build_time(self, project, arch, package, state, number=1):
         """get package build time"""
         pass
 
+    @abstractmethod
+    def package_build_times(self, project, arch, packages):
+        """get the build time of the packages of a repository"""
+        pass
+
     @abstractmethod
     def get_project_config(self, project):
         """get project config"""
@@ -133,6 +172,14 @@ class OpenBuildService(BuildABC):
     OBS build service
     """
 
+    # Codes of a package whose build is over
+    final_build_codes = ("succeeded", "failed", "unresolvable", "excluded")
+    # States of a repository whose scheduler is done with the last change
+    final_repository_states = ("finished", "publishing", "published", "unpublished")
+    # Packages of each project shared by the whole process, see project_packages
+    _project_packages = dict()
+    _project_packages_lock = threading.Lock()
+
     def __init__(self, account=None, password=None) -> None:
         super(OpenBuildService, self).__init__()
         if not config.build_host:
@@ -163,6 +210,51 @@ class OpenBuildService(BuildABC):
             logger.warning(error)
             return dict()
 
+    @staticmethod
+    def iter_attributes(xml: str, *tags):
+        """
+        Stream the elements of an XML document without building the whole tree,
+        every element is cleared once parsed. One element and a list of
+        elements are handled the same way
+        Args:
+            xml: XML text
+            tags: tags of the wanted elements
+
+        Yields:
+            (tag, attributes) of each wanted element, in document order
+
+        Raises:
+            ElementTree.ParseError: the XML is malformed
+        """
+        depth, root = 0, None
+        for event, element in ElementTree.iterparse(
+            io.BytesIO(xml.encode("utf-8")), events=("start", "end")
+        ):
+            if event == "start":
+                root = element if root is None else root
+                depth += 1
+                if element.tag in tags:
+                    yield element.tag, dict(element.attrib)
+                continue
+            depth -= 1
+            element.clear()
+            # Drop the parsed children of the root as well
+            if depth == 1:
+                root.clear()
+
+    def _attribute_values(self, xml, tag, attribute):
+        """
+        Values of an attribute of all elements named tag, None when the XML is malformed
+        """
+        try:
+            return [
+                attributes.get(attribute)
+                for _, attributes in self.iter_attributes(xml, tag)
+            ]
+        except ElementTree.ParseError as error:
+            logger.warning(f"Failed to parse the xml: {error}")
+            return None
+
     @property
     def _server_error(self):
         """Server errors"""
@@ -184,7 +276,7 @@ class OpenBuildService(BuildABC):
             project_name (_type_): _description_
         """
         url = f"{self.host}source/{project}/_meta"
-        response = self._get(url, auth=self._auth(), text=True)
+        response = self._get(url, auth=self._auth(), text=True, cache="project_meta")
         if not response:
             logger.error(f"Failed to get the meta of the project: {url}.")
             return self._request_error
@@ -238,9 +330,36 @@ class OpenBuildService(BuildABC):
             detail=copy_result.get("status", dict()).get("summary"),
         )
 
-    def modify_project_meta(self, project, meta: dict):
+    @staticmethod
+    def _same_xml(current, desired):
+        """
+        Whether two XML documents are equivalent, once canonicalized and
+        stripped of the whitespace between the elements
+        """
+        if not current or not desired:
+            return False
+        try:
+            return ElementTree.canonicalize(
+                current, strip_text=True
+            ) == ElementTree.canonicalize(desired, strip_text=True)
+        except ElementTree.ParseError:
+            return False
+
+    def _current(self, url):
+        """
+        Current content of a source file, always revalidated, None when it can not be read
+        """
+        response = self._get(url, auth=self._auth(), text=True, cache="current")
+        return response if isinstance(response, str) else None
+
+    def modify_project_meta(self, project, meta: dict, compare=True):
         """
         Changing the configuration of the meta value of a test project
+        Args:
+            project: project name
+            meta: project meta
+            compare: read the current meta first and put it only when it differs,
+                every put makes the scheduler re-evaluate the whole project
         """
         url = f"{self.host}source/{project}/_meta"
         repository_xml = ""
@@ -265,6 +384,9 @@ class OpenBuildService(BuildABC):
                 {repository_xml}
             </project>
         """
+        if compare and self._same_xml(self._current(url), meta_xml):
+            logger.info(f"The meta of {project} is unchanged, skip url {url}")
+            return dict(status="success", detail="project meta unchanged")
         response = self._put(url, meta_xml, text=True, auth=self._auth())
         if response is None:
             logger.error(f"Failed to change the project meta: {url}.")
@@ -323,37 +445,91 @@ class OpenBuildService(BuildABC):
         if response is None:
             logger.error(f"Get published project binarys error: {url}")
             return self._request_error
-        binary_result = OpenBuildService.xml_to_dict(response)
-        if not binary_result:
+        binarys = self._attribute_values(response, "entry", "name")
+        if binarys is None:
             return self._server_error
+        return dict(status="success", detail=binarys)
+
+    def build_rpms(self, project, package, repository="standard_x86_64", arch="x86_64"):
+        """
+        Gets the RPM packages generated by a particular REPO
+        """
+        binarys = self.binary_list(project, package, repository, arch)
+        if binarys.get("status") == "failed":
+            return binarys
         return dict(
             status="success",
             detail=[
-                packages["@name"]
-                for packages in binary_result.get("directory", dict()).get("entry", [])
+                binary["filename"]
+                for binary in binarys["detail"]
+                if binary["filename"].endswith("noarch.rpm")
             ],
         )
 
-    def build_rpms(self, project, package, repository="standard_x86_64", arch="x86_64"):
+    def binary_list(self, project, package, repository="standard_x86_64", arch="x86_64"):
         """
-        Gets the RPM packages generated by a particular REPO
+        The binaries generated by a package
+        Args:
+            project: project name
+            package: package name
+            repository: repository name
+            arch: arch
+
+        Returns:
+            binarys: dict(status, detail), the detail lists dict(url, filename, size, mtime)
         """
-        url = f"{self.host}/build/{project}/{repository}/{arch}/{package}"
+        url = f"{self.host}build/{project}/{repository}/{arch}/{package}"
         response = self._get(url, text=True, auth=self._auth())
         if response is None:
             logger.error(f"Get build rpm error: {url}")
             return self._request_error
-        rpms_result = OpenBuildService.xml_to_dict(response)
-        if not rpms_result:
+        try:
+            binarys = [
+                dict(
+                    url=f"{url}/{binary['filename']}",
+                    filename=binary["filename"],
+                    size=binary.get("size"),
+                    mtime=binary.get("mtime"),
+                )
+                for _, binary in self.iter_attributes(response, "binary")
+                if binary.get("filename")
+            ]
+        except ElementTree.ParseError as error:
+            logger.warning(f"Failed to parse the binaries of {package}: {error}")
             return self._server_error
+        return dict(status="success", detail=binarys)
 
-        return dict(
-            status="success",
-            detail=[
-                rpm["@filename"]
-                for rpm in rpms_result.get("binarylist", dict()).get("binary", [])
-                if rpm["@filename"].endswith("noarch.rpm")
-            ],
+    def package_binarys(self, project, package, repository="standard_x86_64", arch="x86_64"):
+        """
+        The rpm packages of a package which get installed, the ones osc getbinaries
+        downloads by default: source, debuginfo and debugsource packages are left out
+        Returns:
+            binarys: list of dict(url, filename, size, mtime), None when the listing failed
+        """
+        binarys = self.binary_list(project, package, repository, arch)
+        if binarys.get("status") == "failed":
+            return None
+        return [
+            binary
+            for binary in binarys["detail"]
+            if binary["filename"].endswith(".rpm")
+            and not binary["filename"].endswith(".src.rpm")
+            and not re.search(r"-debug(info|source)-", binary["filename"])
+        ]
+
+    def download_binarys(self, binarys, directory):
+        """
+        Download binary packages concurrently into the directory,
+        the ones in the rpm cache of the agent are linked from it
+        Args:
+            binarys: list of dict(url, filename, size, mtime), see package_binarys
+            directory: download directory
+
+        Returns:
+            paths: {filename: path}, the path is None for a failed download
+        """
+        return BinaryDownloader(directory, auth=self._auth(), cache=RpmCache()).download(
+            binarys
         )
 
     def modify_package_meta(self, project, package):
@@ -383,22 +559,108 @@ class OpenBuildService(BuildABC):
         if response is None:
             logger.error(f"get project error: {url}")
             return self._request_error
-        result = OpenBuildService.xml_to_dict(response)
-        if not result:
+        packages = self._attribute_values(response, "entry", "name")
+        if packages is None:
             return self._server_error
-        ret = list()
-        if "directory" in result and "@count" in result["directory"]:
-            count = result["directory"]["@count"]
+        return packages
+
+    def build_log_size(self, project, package, arch, last=False):
+        """
+        Size of a package build log in bytes
+        Args:
+            project: project name
+            package: package name
+            arch: arch
+            last: the log of the last finished build instead of the current one
+
+        Returns:
+            size: bytes of the log, None when it is unknown
+        """
+        url = f"{self.build_log(project, package, arch)}?{'last&' if last else ''}view=entry"
+        response = self._get(url, text=True, auth=self._auth())
+        if not response:
+            return None
+        sizes = self._attribute_values(response, "entry", "size")
+        try:
+            return int(sizes[0])
+        except (TypeError, IndexError, ValueError):
+            return None
+
+    def _build_log_part(self, project, package, arch, start, end=None, last=False):
+        """
+        Bytes start to end of a package build log, with the start/end parameters of OBS
+        """
+        url = f"{self.build_log(project, package, arch)}{'?last' if last else ''}"
+        params = dict(start=start)
+        if end is not None:
+            params["end"] = end
+        return self._get(url, text=True, auth=self._auth(), params=params)
+
+    def tail_build_log(self, project, package, arch, size=None, last=True):
+        """
+        The end of a package build log, only the trailing bytes are downloaded.
+        The offset is computed from the size of the log, when the size is not
+        known the bytes are asked for with a suffix Range
+        Args:
+            project: project name
+            package: package name
+            arch: arch
+            size: bytes to read, defaults to constant.BUILD_LOG_TAIL_SIZE
+            last: the log of the last finished build instead of the current one
+
+        Returns:
+            content: the end of the log starting at a line boundary, None when it failed
+        """
+        size = size or constant.BUILD_LOG_TAIL_SIZE
+        log_size = self.build_log_size(project, package, arch, last=last)
+        if log_size is not None:
+            start = max(log_size - size, 0)
+            content = self._build_log_part(project, package, arch, start, last=last)
         else:
-            return ret
-        if count != "0":
-            for pkg in result["directory"]["entry"]:
-                ret.append(pkg["@name"])
-        return ret
+            start = None
+            content = self._get(
+                f"{self.build_log(project, package, arch)}{'?last' if last else ''}",
+                text=True,
+                auth=self._auth(),
+                headers={"Range": f"bytes=-{size}"},
+            )
+        if not isinstance(content, str):
+            return None
+        # A server ignoring the range sends the whole log
+        content = content[-size:]
+        if start != 0 and "\n" in content:
+            # Drop the line cut by the offset
+            content = content.split("\n", 1)[1]
+        return content
+
+    def follow_build_log(self, project, package, arch, offset=0):
+        """
+        Follow the log of the current build of a package, like tail -f
+        Args:
+            project: project name
+            package: package name
+            arch: arch
+            offset: byte of the log to start from
+
+        Yields:
+            content: each new part of the log, the generator ends once the log
+                     stopped growing and the package is in a final state
+        """
+        while True:
+            size = self.build_log_size(project, package, arch)
+            if size is not None and size > offset:
+                content = self._build_log_part(project, package, arch, offset, size)
+                if isinstance(content, str):
+                    offset = size
+                    yield content
+                    continue
+            elif self.get_single_package_state(project, package, arch) in self.final_build_codes:
+                return
+            time.sleep(constant.OBS_POLL_INTERVAL)
 
     def build_package_lastlog(self, project, package, arch):
         """
-        Gets the compile status of the last package
+        Gets the compile status of the last package from the end of its last build log
         Args:
             project (str): project name
             package (str): package name
@@ -407,8 +669,7 @@ class OpenBuildService(BuildABC):
         Returns:
             package build result: package build result
         """
-        package_lastlog_url = f"{self.build_log(project, package, arch)}?last"
-        log_content = self._get(package_lastlog_url, text=True, auth=self._auth())
+        log_content = self.tail_build_log(project, package, arch)
         if not log_content:
             logger.warning(
                 f"Failed to get the result of the last build of the package {package}"
@@ -416,7 +677,7 @@ class OpenBuildService(BuildABC):
             return False
         log_contents = log_content.splitlines()[-10:]
         for log_content in log_contents:
-            if "obs-worker" and "finished" in log_content:
+            if "obs-worker" in log_content and "finished" in log_content:
                 logger.warning(
                     f"The result of the last build of the {package} log was successful"
                 )
@@ -424,6 +685,62 @@ class OpenBuildService(BuildABC):
         logger.warning(f"The result of the last build of the {package} log failed")
         return False
 
+    def project_packages(self, project):
+        """
+        Names of the packages of a project, including those of its linked projects.
+        The listing is kept in memory for the project_packages ttl of config.http_cache_ttl
+        Args:
+            project: project name
+
+        Returns:
+            packages: set of package names, None when the listing failed
+        """
+        ttl = (config.http_cache_ttl or dict()).get("project_packages", 0)
+        with self._project_packages_lock:
+            loaded_at, packages = self._project_packages.get(project, (0, None))
+        if packages is not None and time.time() - loaded_at < ttl:
+            return packages
+        url = f"{self.host}source/{project}"
+        response = self._get(
+            url, text=True, auth=self._auth(), params=dict(expand=1), cache="project_packages"
+        )
+        if not response:
+            logger.warning(f"Failed to list the packages of the project: {url}")
+            return None
+        packages = self._attribute_values(response, "entry", "name")
+        if packages is None:
+            return None
+        packages = set(packages)
+        with self._project_packages_lock:
+            self._project_packages[project] = (time.time(), packages)
+        return packages
+
+    def package_projects(self, packages, projects):
+        """
+        Find the project holding each package, the projects are searched in order
+        Args:
+            packages: package names
+            projects: candidate projects, the first one holding a package wins
+
+        Returns:
+            package_projects: {package: project}, packages found nowhere are left out
+        """
+        package_projects = dict()
+        missing = list(dict.fromkeys(packages))
+        for project in projects:
+            if not missing:
+                break
+            project_packages = self.project_packages(project)
+            for package in missing:
+                if project_packages is None:
+                    found = self.get_package_meta("info", project, package)
+                else:
+                    found = package in project_packages
+                if found:
+                    package_projects[package] = project
+            missing = [package for package in missing if package not in package_projects]
+        return package_projects
+
     def get_package_info(self, project):
         """
         Get package information for a project
@@ -438,22 +755,10 @@ class OpenBuildService(BuildABC):
         if response is None:
             logger.error(f"get project error: {url}")
             return self._request_error
-        result = self.xml_to_dict(response)
-        if not result:
+        packages = self._attribute_values(response, "entry", "name")
+        if packages is None:
             return self._server_error
-        ret = list()
-        if "directory" in result and "@count" in result["directory"]:
-            count = result["directory"]["@count"]
-        else:
-            return ret
-        if count != "0":
-            if isinstance(result["directory"]["entry"], list):
-                for pkg in result["directory"]["entry"]:
-                    ret.append(pkg.get("@name"))
-            else:
-                for pkg in result["directory"]["entry"].values():
-                    ret.append(pkg)
-        return ret
+        return packages
 
     def get_package_meta(self, level, project, package):
         """
@@ -466,7 +771,7 @@ class OpenBuildService(BuildABC):
             Returns true if the package exists, or false if it does not.
         """
         url = f"{self.host}source/{project}/{package}/_meta"
-        response = self._get(url, level, text=True, auth=self._auth())
+        response = self._get(url, level, text=True, auth=self._auth(), cache="package_meta")
         if response:
             return True
         return False
@@ -506,6 +811,50 @@ class OpenBuildService(BuildABC):
         if states:
             return states["status"]["@code"]
 
+    def _package_build_states(self, project, response):
+        """
+        Parse the _result of a project
+        Args:
+            project: project name
+            response: _result xml
+
+        Returns:
+            state: state hash of the result list, passed as oldstate to wait for a change
+            package_results: build results for each package, None when there is none
+            settled: whether no repository is dirty or still scheduling, blocked or building,
+                     until then the codes may be the ones of the previous build
+        """
+        state, arch, settled = None, None, True
+        package_results = list()
+        try:
+            for tag, attributes in self.iter_attributes(
+                response, "resultlist", "result", "status"
+            ):
+                if tag == "resultlist":
+                    state = attributes.get("state")
+                elif tag == "result":
+                    arch = attributes.get("arch")
+                    if (
+                        attributes.get("dirty") == "true"
+                        or attributes.get("state") not in self.final_repository_states
+                    ):
+                        settled = False
+                else:
+                    package_results.append(
+                        dict(
+                            package=attributes.get("package"),
+                            result=attributes.get("code"),
+                            arch=arch,
+                            log_url="this package status is excluded"
+                            if attributes.get("code") == "excluded"
+                            else self.build_log(project, attributes.get("package"), arch),
+                        )
+                    )
+        except ElementTree.ParseError as error:
+            logger.warning(f"Failed to parse the build result of {project}: {error}")
+            return None, None, False
+        return state, package_results or None, settled
+
     def get_project_build_state(self, project):
         """
         Get the compilation status of the package under the project
@@ -517,49 +866,87 @@ class OpenBuildService(BuildABC):
         """
         url = f"{self.host}/build/{project}/_result"
         response = self._get(url, text=True, auth=self._auth())
-        package_results = list()
         wrong_project_state = [{"result": "building"}]
         if not response:
             return wrong_project_state
-        states = self.xml_to_dict(response)
-        if not states:
-            return wrong_project_state
-        build_results = states.get("resultlist", dict()).get("result", dict())
-        if not build_results or not build_results.get("status"):
-            return wrong_project_state
+        _, package_results, _ = self._package_build_states(project, response)
+        return package_results or wrong_project_state
 
-        if isinstance(build_results.get("status"), dict):
-            package_results.append(
-                dict(
-                    package=build_results.get("status").get("@package"),
-                    result=build_results.get("status").get("@code"),
-                    arch=build_results.get("@arch"),
-                    log_url="this package status is excluded"
-                    if build_results.get("status").get("@code") == "excluded"
-                    else self.build_log(
-                        project,
-                        build_results.get("status").get("@package"),
-                        build_results.get("@arch"),
-                    ),
-                )
+    def watch_project_build_state(self, project):
+        """
+        Watch the compilation status of the packages under the project.
+        Each request of _result passes the last state as oldstate, OBS holds it
+        until a package changes, so a change is seen as soon as it happens
+        Args:
+            project: project name
+
+        Yields:
+            package_result: build result of a package whenever its code changed,
+                            the generator ends once every package is in a final state
+                            and every repository is settled
+        """
+        url = f"{self.host}/build/{project}/_result"
+        codes = dict()
+        oldstate = None
+        # Give the scheduler the time to see the change that was just committed
+        time.sleep(constant.OBS_POLL_INTERVAL)
+        while True:
+            if oldstate:
+                response = self._wait_result(url, oldstate)
+                if response is None:
+                    # Nothing changed while the server held the request
+                    continue
+            else:
+                response = self._get(url, text=True, auth=self._auth())
+            state, package_results, settled = (
+                self._package_build_states(project, response)
+                if response
+                else (None, None, False)
             )
-        else:
-            for build_result in build_results.get("status"):
-                package_results.append(
-                    dict(
-                        package=build_result.get("@package"),
-                        result=build_result.get("@code"),
-                        arch=build_results.get("@arch"),
-                        log_url="this package status is excluded"
-                        if build_result.get("@code") == "excluded"
-                        else self.build_log(
-                            project,
-                            build_result.get("@package"),
-                            build_results.get("@arch"),
-                        ),
-                    )
-                )
-        return package_results
+            for package_result in package_results or []:
+                key = (package_result.get("package"), package_result.get("arch"))
+                if codes.get(key) != package_result.get("result"):
+                    codes[key] = package_result.get("result")
+                    yield package_result
+            if (
+                package_results
+                and settled
+                and all(code in self.final_build_codes for code in codes.values())
+            ):
+                return
+            # Failed request, or a server that answers at once without long polling
+            if not state or state == oldstate:
+                time.sleep(constant.OBS_POLL_INTERVAL)
+            oldstate = state or oldstate
+
+    def _wait_result(self, url, oldstate):
+        """
+        Long poll of _result, sent outside the retries and the circuit breaker
+        of Api._send: a poll held until its read timeout is the normal outcome
+        when no package changed, not a failure of the server
+        Args:
+            url: url of the _result of the project
+            oldstate: state of the last answer
+
+        Returns:
+            the answer, "" when the request failed, None when nothing changed
+        """
+        try:
+            response = self._session(url, auth=self._auth()).get(
+                url,
+                params=dict(oldstate=oldstate),
+                timeout=(30, constant.OBS_LONG_POLL_TIMEOUT),
+                verify=False,
+            )
+        except ReadTimeout:
+            return None
+        except RequestException as error:
+            logger.warning(f"Long poll of {url} failed, message: {error}")
+            return ""
+        if response.status_code != 200:
+            logger.warning(f"Long poll of {url} failed, status code: {response.status_code}")
+            return ""
+        return response.text
 
     def package_build_time(self, project, arch, package, state, number=1):
         """Package compilation time"""
@@ -585,18 +972,71 @@ class OpenBuildService(BuildABC):
             logger.error(f"Failed to get {package} package compile time")
         return build_time
 
+    def package_build_times(self, project, arch, packages):
+        """
+        Compilation time of the packages of a repository, read from one job
+        history sized to the packages, a package whose job is not in it is
+        looked up on its own with package_build_time
+        Args:
+            project: project name
+            arch: architecture of the standard_{arch} repository
+            packages: {package: code of its build result}
+
+        Returns:
+            build_times: {package: seconds} of the latest job of each package
+        """
+        url = f"{self.host}/build/{project}/standard_{arch}/{arch}/_jobhistory"
+        response = self._get(
+            url,
+            text=True,
+            auth=self._auth(),
+            params=dict(limit=len(packages) * constant.OBS_JOBHISTORY_JOBS_PER_PACKAGE),
+        )
+        build_times, endtimes = dict(), dict()
+        try:
+            for _, jobhist in self.iter_attributes(response, "jobhist") if response else ():
+                package = jobhist.get("package")
+                if package not in packages:
+                    continue
+                try:
+                    endtime = int(jobhist.get("endtime"))
+                    # The latest job of a package wins, whatever the order of the list
+                    if endtime >= endtimes.get(package, endtime):
+                        build_times[package] = endtime - int(jobhist.get("starttime"))
+                        endtimes[package] = endtime
+                except (TypeError, ValueError):
+                    logger.error(f"Failed to get {package} package compile time")
+        except ElementTree.ParseError as error:
+            logger.error(f"Failed to parse the job history of {project}: {error}")
+        for package, code in packages.items():
+            # Only a built package has a job, an unresolvable one has none to look for
+            if package not in build_times and code in ("succeeded", "failed"):
+                build_times[package] = self.package_build_time(project, arch, package, code)
+        return build_times
+
     def get_project_config(self, project):
         """Get the project's configuration"""
         url = f"{self.host}/source/{project}/_config"
-        response = self._get(url, text=True, auth=self._auth())
+        response = self._get(url, text=True, auth=self._auth(), cache="project_config")
         if response is None:
             logger.error(f"fail to get {project} _config")
             return self._server_error
         return response
 
-    def put_project_config(self, project, config):
-        """Modify the configuration of a test project"""
+    def put_project_config(self, project, config, compare=True):
+        """
+        Modify the configuration of a test project
+        Args:
+            project: project name
+            config: project config
+            compare: read the current config first and put it only when it differs
+        """
         url = f"{self.host}/source/{project}/_config"
+        if compare and isinstance(config, str):
+            current = self._current(url)
+            if current is not None and current.strip() == config.strip():
+                logger.info(f"The config of {project} is unchanged, skip url {url}")
+                return dict(status="succeeded", detail="project config unchanged")
         response = self._put(url, config, text=True, auth=self._auth())
         if not response:
             logger.error(f"fail to get {project} _config")
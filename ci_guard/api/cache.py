@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2021. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from logger import logger
+
+
+class CacheEntry:
+    """
+    A cached GET response body and the validators to revalidate it
+    """
+
+    def __init__(self, url, body, etag=None, last_modified=None, stored_at=None):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at or time.time()
+
+    @classmethod
+    def from_response(cls, url, response):
+        return cls(
+            url=url,
+            body=response.text,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+
+    def fresh(self, ttl):
+        """
+        Whether the entry can be served without asking the server
+        """
+        return time.time() - self.stored_at < ttl
+
+    def validators(self):
+        """
+        Conditional request headers, empty when the server gave no validator
+        """
+        headers = dict()
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def content(self, text=False):
+        return self.body if text else json.loads(self.body)
+
+    def to_dict(self):
+        return dict(
+            url=self.url,
+            body=self.body,
+            etag=self.etag,
+            last_modified=self.last_modified,
+            stored_at=self.stored_at,
+        )
+
+
+class ResponseCache:
+    """
+    Cache of GET responses: an in-memory LRU, optionally backed by an on-disk store
+    so that successive gate runs on the same worker share it.
+    Entries are keyed by url and a digest of the params and credentials
+    """
+
+    def __init__(self, max_entries=256, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url, params=None, auth=None):
+        """
+        Cache key of a request
+        :param url: request url
+        :param params: query params, the access token is part of them
+        :param auth: basic authentication of the request
+        """
+        variant = json.dumps(
+            [sorted((params or dict()).items()), getattr(auth, "username", None)],
+            default=str,
+        )
+        return url, hashlib.sha256(variant.encode("utf-8")).hexdigest()
+
+    def _url_dir(self, url):
+        return os.path.join(
+            self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest()
+        )
+
+    def _path(self, key):
+        url, variant = key
+        return os.path.join(self._url_dir(url), f"{variant}.json")
+
+    def get(self, key):
+        """
+        Cached entry of the key, the memory is looked up before the disk
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as file:
+                entry = CacheEntry(**json.load(file))
+        except (OSError, ValueError, TypeError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        """
+        Store the entry in memory and on disk
+        """
+        self._remember(key, entry)
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self._url_dir(key[0]), exist_ok=True)
+            # The url is kept next to its entries to invalidate them by prefix
+            url_path = os.path.join(self._url_dir(key[0]), "url")
+            if not os.path.exists(url_path):
+                with open(url_path, "w", encoding="utf-8") as file:
+                    file.write(key[0])
+            fd, tmp_path = tempfile.mkstemp(dir=self._url_dir(key[0]), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(entry.to_dict(), file)
+            os.replace(tmp_path, self._path(key))
+        except OSError as error:
+            logger.warning(f"Failed to store the response of {key[0]}: {error}")
+
+    def refresh(self, key, entry):
+        """
+        The server confirmed the entry is still valid, restart its ttl
+        """
+        entry.stored_at = time.time()
+        self.put(key, entry)
+
+    def invalidate(self, url):
+        """
+        Drop every entry of the url, called when the resource is modified.
+        The resources below the url are dropped as well,
+        e.g. source/{project}/_meta when source/{project} is deleted
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0].startswith(url)]:
+                del self._entries[key]
+        if not self.directory:
+            return
+        try:
+            url_dirs = os.listdir(self.directory)
+        except OSError:
+            return
+        for url_dir in url_dirs:
+            url_dir = os.path.join(self.directory, url_dir)
+            try:
+                with open(os.path.join(url_dir, "url"), "r", encoding="utf-8") as file:
+                    stale = file.read().startswith(url)
+            except OSError:
+                # Entries whose url is not known can not be told apart, drop them
+                stale = True
+            if stale:
+                shutil.rmtree(url_dir, ignore_errors=True)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
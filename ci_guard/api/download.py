@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2021. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+import os
+import time
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from retrying import RetryError
+import constant
+from conf import config
+from logger import logger
+from api.backoff import Backoff, RETRYABLE_EXCEPTIONS
+from . import Api
+
+# Bytes written at a time while a file is downloaded
+_CHUNK_SIZE = 1024 * 1024
+
+
+class BinaryDownloader:
+    """
+    Download files concurrently over the pooled sessions of Api.
+    A file is written to a temporary file next to its target and moved in
+    place only once its size and checksum are verified, a failed or
+    interrupted download never leaves a partial file behind.
+    With a cache (see api.rpm_cache.RpmCache) the files already downloaded
+    by a job of the agent are taken from it instead, its index is updated
+    once the whole batch is downloaded
+    """
+
+    def __init__(self, directory, auth=None, max_workers=None, cache=None):
+        self.directory = directory
+        self.auth = auth
+        self.max_workers = max_workers or config.download_concurrency
+        self.cache = cache
+
+    def _verify(self, binary, size, digest):
+        """
+        Whether the downloaded bytes match the size and sha256 of the listing
+        """
+        if binary.get("size") is not None and int(binary["size"]) != size:
+            logger.warning(
+                f"Size of {binary['filename']} is {size}, {binary['size']} was expected"
+            )
+            return False
+        if binary.get("sha256") and binary["sha256"] != digest:
+            logger.warning(f"Checksum of {binary['filename']} does not match")
+            return False
+        return True
+
+    def _write(self, response, binary):
+        """
+        Write the body of the response to a temporary file of the directory
+        :return: path of the temporary file, None when the content is not the expected one
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        sha256, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                    file.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        if not self._verify(binary, size, sha256.hexdigest()):
+            os.remove(tmp_path)
+            return None
+        return tmp_path
+
+    def fetch(self, binary):
+        """
+        Download a file, a broken transfer or a content not matching the
+        listing is downloaded again
+        :param binary: dict(url, filename, size, mtime, sha256), all but url and filename
+                       are optional
+        :return: path of the downloaded file, None when it failed
+        """
+        path = os.path.join(self.directory, binary["filename"])
+        if self.cache is not None and self.cache.get(binary, path):
+            return path
+        backoff = Backoff()
+        for attempt in range(1, constant.STOP_MAX_ATTEMPT_NUMBER + 1):
+            try:
+                response = Api._send(
+                    binary["url"],
+                    "get",
+                    auth=self.auth,
+                    stream=True,
+                    timeout=(30, 300),
+                )
+            except RetryError:
+                response = None
+            if not isinstance(response, requests.Response):
+                break
+            try:
+                with response:
+                    tmp_path = self._write(response, binary)
+            except RETRYABLE_EXCEPTIONS as error:
+                logger.warning(f"Download of {binary['url']} was interrupted: {error}")
+                tmp_path = None
+            except OSError as error:
+                logger.error(f"Failed to write {binary['filename']}: {error}")
+                break
+            if tmp_path:
+                os.replace(tmp_path, path)
+                if self.cache is not None:
+                    self.cache.put(binary, path)
+                return path
+            if attempt < constant.STOP_MAX_ATTEMPT_NUMBER:
+                time.sleep(backoff.delay(attempt))
+        logger.error(f"Failed to download {binary['url']}")
+        return None
+
+    def download(self, binarys):
+        """
+        Download the files at the same time, at most max_workers at a time
+        :param binarys: list of dict(url, filename, size, sha256)
+        :return: {filename: path}, the path is None for a file which failed
+        """
+        if not binarys:
+            return dict()
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                paths = executor.map(self.fetch, binarys)
+                return {
+                    binary["filename"]: path for binary, path in zip(binarys, paths)
+                }
+        finally:
+            if self.cache is not None:
+                # The cache index is written once for the whole batch
+                self.cache.flush()
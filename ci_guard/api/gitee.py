@@ -11,8 +11,12 @@
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
 import json
+from concurrent.futures import ThreadPoolExecutor
 from conf import config
+from exception import RequestError
+from logger import logger
 from . import Api
+from .maintainer import MaintainerIndex, SIG_INFO_URL
 
 
 class Gitee(Api):
@@ -21,7 +25,7 @@ class Gitee(Api):
     """
 
     host = "https://gitee.com/api/v5/repos"
-    pkg_info_url = "https://www.openeuler.org/api-omapi/query/sig/info"
+    pkg_info_url = SIG_INFO_URL
 
     def __init__(self, repo, owner="src-openeuler", token=None):
         super(Gitee, self).__init__()
@@ -60,46 +64,79 @@ class Gitee(Api):
         :param number: Pr number
         """
         url = f"{self.host}/{self._owner}/{self._repo}/pulls/{number}"
-        return self._get(url, params=self._params())
+        return self._get(url, params=self._params(), cache="pull")
+
+    def _paginate(self, url, per_page=100, **params):
+        """
+        Stream the items of a paginated list endpoint page after page,
+        the next page is fetched while the caller consumes the current one.
+        Stop iterating to stop paging
+        :param url: list endpoint
+        :param params: query params besides the paging ones
+        :raises RequestError: a page could not be fetched, the list would be incomplete
+        """
+
+        def fetch(page):
+            return self._get(
+                url, params=self._params(page=page, per_page=per_page, **params)
+            )
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            page, previous = 1, None
+            future = executor.submit(fetch, page)
+            while future is not None:
+                items = future.result()
+                if items is None or items is False:
+                    raise RequestError(f"{url} page {page}")
+                # Endpoints which ignore paging return the same list again
+                if not items or items == previous:
+                    return
+                page += 1
+                future = executor.submit(fetch, page) if len(items) >= per_page else None
+                yield from items
+                previous = items
+        finally:
+            executor.shutdown(wait=False)
+
+    def iter_pulls(self, state="all"):
+        """
+        Pulls of the repository, newest first
+        :param state: open, closed, merged or all
+        """
+        url = f"{self.host}/{self._owner}/{self._repo}/pulls"
+        return self._paginate(url, state=state)
+
+    def iter_labels(self, pr_number):
+        """
+        Labels of the pull
+        """
+        url = f"{self.host}/{self._owner}/{self._repo}/pulls/{pr_number}/labels"
+        return self._paginate(url)
+
+    def iter_comments(self, pr_number):
+        """
+        Comments of the pull, oldest first
+        """
+        url = f"{self.host}/{self._owner}/{self._repo}/pulls/{pr_number}/comments"
+        return self._paginate(url)
+
+    def iter_pr_files(self, pr_number):
+        """
+        Files changed by the pull
+        """
+        url = f"{self.host}/{self._owner}/{self._repo}/pulls/{pr_number}/files"
+        return self._paginate(url)
 
     def package_committer(self, package_names, community="openeuler", search="fuzzy"):
         """
-        Get maintainer information for a package
+        Get maintainer information for packages
         Args:
-            package_names : package repository name
+            package_names : package repository names
         Returns:
-
+            {package: dict(name, email, sig)}, packages without maintainer are left out
         """
-
-        def parse_maintainer(content, pkg_name):
-            """
-            parse maintainer information for a package
-            Args:
-                content : maintainer information
-                pkg_name : package repository name
-             Returns:
-            """
-            pkg_info = content["data"]
-            for con in pkg_info:
-                for repo in con["repos"]:
-                    if pkg_name in repo:
-                        maintainer = con["maintainer_info"][0]
-                        commiters[pkg_name] = dict(
-                            name=maintainer.get("gitee_id"),
-                            email=maintainer.get("email"),
-                            sig=con.get("sig_name"),
-                        )
-            return commiters
-
-        values = dict(community=community, search=search)
-        commiters = dict()
-        response = self._get(self.pkg_info_url, params=values)
-        for package_name in package_names:
-            try:
-                commiters.update(parse_maintainer(response, package_name))
-            except IndexError:
-                continue
-        return commiters
+        return MaintainerIndex.instance(community, search).lookup(package_names)
 
     def create_tag(self, pr_number, body):
         """
@@ -115,12 +152,55 @@ class Gitee(Api):
         url = f"{self.host}/{self._owner}/{self._repo}/pulls/{pr_number}/labels/{label}?access_token={self._token}"
         return self._delete(url)
 
-    def get_all_tag(self, pr_number, body):
+    def reconcile_labels(self, pr_number, desired_add=(), desired_remove=()):
         """
-        Get pull all tags
+        Bring the labels of the pull to the desired state with the fewest calls.
+        The current labels are read once, only the labels to change are written:
+        each one to remove is deleted first, so that the pull never carries both
+        the old and the new label, then the ones to add are created in one call.
+        The labels set by others meanwhile are left alone
+        :param pr_number: pull number
+        :param desired_add: labels the pull must carry
+        :param desired_remove: labels the pull must not carry
+        :return: True when the labels are in the desired state
         """
-        url = f"{self.host}/{self._owner}/{self._repo}/pulls/{pr_number}/labels"
-        return self._get(url, self._params(body=body))
+        try:
+            current = set(tag.get("name") for tag in self.iter_labels(pr_number))
+        except RequestError as error:
+            logger.warning(f"Labels of pull {pr_number} are unknown, applied one by one: {error}")
+            return self._apply_labels(pr_number, desired_add, desired_remove)
+        return self._apply_labels(
+            pr_number,
+            set(desired_add).difference(current),
+            set(desired_remove).intersection(current),
+        )
+
+    def _apply_labels(self, pr_number, desired_add, desired_remove):
+        """
+        Remove then add the labels, a label already absent (404) is fine
+        :return: True when the labels are in the desired state
+        """
+        success = True
+        for label in sorted(set(desired_remove).difference(desired_add)):
+            if self.remove_tag(pr_number, label) is None:
+                success = False
+        if desired_add:
+            response = self.create_tag(pr_number, sorted(set(desired_add)))
+            success = success and response is not None and response is not False
+        return success
+
+    def get_all_tag(self, pr_number, body=None):
+        """
+        Get pull all tags, every page of them
+        :param body: no longer used, the paging is done by iter_labels
+        :return: the tags, None when they could not all be read
+        """
+        try:
+            return list(self.iter_labels(pr_number))
+        except RequestError as error:
+            logger.error(error)
+            return None
+
     def get_issue(self, cve_issue, enterprises="open_euler"):
         issue_url = f"https://gitee.com/api/v5/enterprises/{enterprises}/issues/{cve_issue}?access_token={self._token}"
         return self._get(issue_url)
@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2021. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+import os
+import json
+import time
+import tempfile
+import threading
+import constant
+from conf import config
+from logger import logger
+from . import Api
+
+SIG_INFO_URL = "https://www.openeuler.org/api-omapi/query/sig/info"
+
+# Packages live in src-openeuler, its repositories win over a namesake elsewhere
+_PACKAGE_OWNER = "src-openeuler"
+
+
+class MaintainerIndex:
+    """
+    Repository name to maintainer and sig index built from the sig database.
+    The index is stored under the workspace and shared by the gate runs of the
+    worker, once older than config.maintainer_index_ttl it is downloaded again.
+    Look packages up through Gitee.package_committer
+    """
+
+    _instances = dict()
+    _instances_lock = threading.Lock()
+
+    def __init__(self, community="openeuler", search="fuzzy"):
+        self.community = community
+        self.search = search
+        self._index = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, community="openeuler", search="fuzzy"):
+        """
+        Index shared by the whole process
+        """
+        with cls._instances_lock:
+            key = (community, search)
+            if key not in cls._instances:
+                cls._instances[key] = cls(community, search)
+            return cls._instances[key]
+
+    @property
+    def path(self):
+        return os.path.join(
+            constant.MAINTAINER_INDEX_PATH, f"{self.community}-{self.search}.json"
+        )
+
+    @staticmethod
+    def build(content):
+        """
+        Index the sig database by the repository name without its owner
+        :param content: response of the sig info api
+        :return: {repo: dict(name=gitee_id, email=email, sig=sig_name)}
+        """
+        index = dict()
+        owners = dict()
+        for sig in (content or dict()).get("data") or []:
+            if not sig.get("maintainer_info"):
+                continue
+            maintainer = sig["maintainer_info"][0]
+            for repo in sig.get("repos") or []:
+                owner, _, name = repo.rpartition("/")
+                if name in index and owners[name] == _PACKAGE_OWNER:
+                    continue
+                owners[name] = owner
+                index[name] = dict(
+                    name=maintainer.get("gitee_id"),
+                    email=maintainer.get("email"),
+                    sig=sig.get("sig_name"),
+                )
+        return index
+
+    def _fetch(self):
+        """
+        Download the sig database and store its index
+        """
+        response = Api._get(
+            SIG_INFO_URL, params=dict(community=self.community, search=self.search)
+        )
+        if not response:
+            logger.warning(f"Failed to get the sig info of {self.community}")
+            return None
+        index = self.build(response)
+        try:
+            os.makedirs(constant.MAINTAINER_INDEX_PATH, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=constant.MAINTAINER_INDEX_PATH, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(index, file)
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            logger.warning(f"Failed to store the maintainer index: {error}")
+        return index
+
+    def _load(self):
+        """
+        Index stored by a previous run and the time it was built
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file), os.path.getmtime(self.path)
+        except (OSError, ValueError):
+            return None, 0
+
+    def _current(self):
+        """
+        The index, downloaded again when there is none or it is stale.
+        The stale index is still served when the download fails
+        """
+        with self._lock:
+            if self._index is None:
+                self._index, self._loaded_at = self._load()
+            if time.time() - self._loaded_at > config.maintainer_index_ttl:
+                index = self._fetch()
+                if index is not None:
+                    self._index, self._loaded_at = index, time.time()
+            return self._index or dict()
+
+    def get(self, package):
+        """
+        Maintainer of the package repository, None when it is unknown
+        """
+        return self._current().get(package)
+
+    def lookup(self, packages):
+        """
+        Maintainers of the package repositories
+        :return: {package: dict(name, email, sig)}, unknown packages are left out
+        """
+        index = self._current()
+        return {package: index[package] for package in packages if package in index}
@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2021. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+import constant
+from conf import config
+from logger import logger
+
+# ioctl cloning a file on the file systems supporting reflinks (btrfs, xfs)
+_FICLONE = 0x40049409
+
+
+class RpmCache:
+    """
+    Content addressed cache of rpm packages shared by the gate jobs of an agent.
+    A file is stored once under the sha256 of its content, an index maps the
+    file name (its NEVRA), size and mtime given by the build service to that
+    digest. Files are materialized in the job workspace with a reflink, or a
+    copy when the file system has none, never a hardlink: a job changing its
+    rpm must not change the cached one, which is also kept read-only.
+    The index is replaced atomically and read without a lock, the files are
+    copied without a lock as well. Only flush, which writes the index entries
+    of a batch of files at once and evicts the least recently used files once
+    the cache outgrows config.rpm_cache_size, takes the file lock shared by
+    the concurrent jobs
+    """
+
+    def __init__(self, root=None, max_size=None):
+        self.root = root or config.rpm_cache_dir or constant.RPM_CACHE_PATH
+        self.max_size = max_size or config.rpm_cache_size
+        # Index entries of the files got or put since the last flush
+        self._pending = dict(keys=dict(), objects=dict())
+        self._pending_lock = threading.Lock()
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.root, "index.json")
+
+    def _object_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    @staticmethod
+    def key(binary):
+        """
+        Index key of a binary of a listing, a rebuilt rpm keeps its name but not its mtime
+        """
+        return f"{binary['filename']}:{binary.get('size')}:{binary.get('mtime')}"
+
+    def _read_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return dict(keys=dict(), objects=dict())
+
+    @contextmanager
+    def _locked_index(self):
+        """
+        Index of the cache, held under an exclusive lock and written back on exit
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = self._read_index()
+            yield index
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(index, file)
+            os.replace(tmp_path, self._index_path)
+
+    @staticmethod
+    def _clone(source, target):
+        """
+        Reflink the source to the target, a plain copy when the file system can not
+        """
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            except OSError:
+                shutil.copyfileobj(src, dst)
+
+    def _materialize(self, source, target, mode=None):
+        """
+        Place a copy of the source at the target path, replacing what is there
+        """
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            self._clone(source, tmp_path)
+            if mode is not None:
+                os.chmod(tmp_path, mode)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _record(self, sha256, key=None, size=None):
+        with self._pending_lock:
+            entry = self._pending["objects"].setdefault(sha256, dict())
+            entry["used_at"] = time.time()
+            if size is not None:
+                entry["size"] = size
+            if key is not None:
+                self._pending["keys"][key] = sha256
+
+    def get(self, binary, target):
+        """
+        Materialize a cached binary
+        :param binary: dict(filename, size, mtime, sha256) of the listing, sha256 is optional
+        :param target: path of the file in the workspace
+        :return: True when the binary was in the cache
+        """
+        key = self.key(binary)
+        with self._pending_lock:
+            sha256 = binary.get("sha256") or self._pending["keys"].get(key)
+        sha256 = sha256 or self._read_index()["keys"].get(key)
+        if not sha256:
+            return False
+        try:
+            # An object evicted meanwhile is missing, the binary is downloaded then
+            self._materialize(self._object_path(sha256), target)
+        except FileNotFoundError:
+            return False
+        except OSError as error:
+            logger.warning(f"Failed to get {binary['filename']} from the rpm cache: {error}")
+            return False
+        self._record(sha256)
+        return True
+
+    def put(self, binary, path):
+        """
+        Store a downloaded binary, its index entry is written by flush
+        :param binary: dict(filename, size, mtime) of the listing
+        :param path: path of the downloaded file
+        """
+        sha256 = hashlib.sha256()
+        try:
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            sha256 = sha256.hexdigest()
+            object_path = self._object_path(sha256)
+            # The path is named by the content, a concurrent put of the same file is harmless
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                self._materialize(path, object_path, mode=0o444)
+            self._record(sha256, key=self.key(binary), size=os.path.getsize(object_path))
+        except OSError as error:
+            logger.warning(f"Failed to store {binary['filename']} in the rpm cache: {error}")
+
+    def flush(self):
+        """
+        Write the index entries of the files got or put since the last flush, then evict
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, dict(keys=dict(), objects=dict())
+        if not pending["objects"]:
+            return
+        try:
+            with self._locked_index() as index:
+                for sha256, entry in pending["objects"].items():
+                    if sha256 in index["objects"]:
+                        index["objects"][sha256]["used_at"] = entry["used_at"]
+                    elif "size" in entry and os.path.exists(self._object_path(sha256)):
+                        index["objects"][sha256] = entry
+                index["keys"].update(
+                    (key, sha256)
+                    for key, sha256 in pending["keys"].items()
+                    if sha256 in index["objects"]
+                )
+                self._evict(index)
+        except OSError as error:
+            logger.warning(f"Failed to update the rpm cache index: {error}")
+
+    def _evict(self, index):
+        """
+        Remove the least recently used files until the cache fits in max_size
+        """
+        objects = index["objects"]
+        total = sum(entry["size"] for entry in objects.values())
+        for sha256 in sorted(objects, key=lambda sha256: objects[sha256]["used_at"]):
+            if total <= self.max_size:
+                break
+            total -= objects.pop(sha256)["size"]
+            try:
+                os.remove(self._object_path(sha256))
+            except FileNotFoundError:
+                pass
+        index["keys"] = {
+            key: sha256 for key, sha256 in index["keys"].items() if sha256 in objects
+        }
@@ -174,7 +174,12 @@ function abi_compare(){
     pr_commit_json_file="${WORKSPACE}/pr_commit_json_file"
     # comment_file="${repo}_${prid}_${arch}_comment"
     if [[ ${platform} != "github" ]]; then
-        curl https://gitee.com/api/v5/repos/${repo_owner}/${repo}/pulls/${prid}/files?access_token=$GiteeToken >$pr_commit_json_file
+        python3 $SCRIPT_CMD pr-files -pr $pr --owner ${repo_owner} -o $pr_commit_json_file
+        if [ $? -ne 0 ]; then
+            echo "Failed to get the files changed by the PR"
+            scp_remote_service
+            exit 1
+        fi
     fi
     compare_result="${repo}_${prid}_${arch}_compare_result"
     export PYTHONPATH=${shell_pathoe}
@@ -17,6 +17,7 @@ from cli.build import build
 from cli.comment import notify
 from cli.analysis import diff_analysis
 from cli.pull_link import pull_link
+from cli.pull_files import pull_files
 from cli.download import download_rpm
 from cli.initrepo import init_repo
 from cli.license import license
@@ -41,6 +42,7 @@ __all__ = (
     "notify",
     "diff_analysis",
     "pull_link",
+    "pull_files",
     "download_rpm",
     "init_repo",
     "hotpatch",
@@ -20,6 +20,7 @@ from cli import (
     install,
     notify,
     pull_link,
+    pull_files,
     download_rpm,
     init_repo,
     license,
@@ -76,6 +77,7 @@ class CiGroup(click.Group):
         self.add_command(notify)
         self.add_command(diff_analysis)
         self.add_command(pull_link)
+        self.add_command(pull_files)
         self.add_command(download_rpm)
         self.add_command(init_repo)
         self.add_command(license)
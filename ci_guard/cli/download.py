@@ -13,6 +13,7 @@
 import os
 import shutil
 import click
+from api.build_env import OpenBuildService
 from core import ProjectMapping
 from command import command
 from logger import logger
@@ -36,12 +37,13 @@ def obs_binary_rpm_download(branch, package, arch):
             )
         )
         exit(1)
+    obs = OpenBuildService()
     for project in projects:
-        code, _, _ = command(
-            cmds=["osc", "getbinaries", project, package, "standard_" + arch, arch],
-            cwd=os.path.join(config.workspace, "old_rpms"),
-        )
-        if not code:
+        binarys = obs.package_binarys(project, package, "standard_" + arch, arch)
+        if not binarys:
+            continue
+        paths = obs.download_binarys(binarys, os.path.join(config.workspace, "old_rpms"))
+        if all(paths.values()):
             logger.info("Downloading the archive rpm package is complete")
             exit(0)
     logger.error("Failed to download the archive binary package.")
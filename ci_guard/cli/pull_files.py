@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2021. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+import os
+import json
+import click
+from api.gitee import Gitee
+from core import extract_repo_pull
+from exception import RequestError
+
+
+@click.command("pr-files", help="Save the files changed by a pull")
+@click.option("-pr", help="PR complete path", required=True)
+@click.option("-o", "--output", help="Json file the changed files are written to", required=True)
+@click.option("--owner", help="Owner of the repository", default="src-openeuler", show_default=True)
+def pull_files(pr, output, owner):
+    """
+    Stream every page of the changed files of the pull into a json array
+    :param pr: pull link
+    :param output: json file
+    :param owner: owner of the repository
+    """
+    repo, number = extract_repo_pull(pr)
+    if not all([repo, number]):
+        click.echo(click.style("Not a correct PR link", fg="red"))
+        exit(1)
+    try:
+        with open(output, "w", encoding="utf-8") as file:
+            file.write("[")
+            for index, pr_file in enumerate(Gitee(repo=repo, owner=owner).iter_pr_files(number)):
+                if index:
+                    file.write(",")
+                json.dump(pr_file, file)
+            file.write("]")
+    except RequestError as error:
+        # A partial list of files must not be checked as if it were complete
+        os.remove(output)
+        click.echo(click.style(f"Failed to get the files of the PR: {error}", fg="red"))
+        exit(1)
+
+
+__all__ = ("pull_files",)
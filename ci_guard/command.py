@@ -11,29 +11,366 @@
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
 import os
+import re
+import json
+import time
+import signal
+import asyncio
+import threading
+import selectors
 import subprocess
+import tempfile
+from collections import deque
 from logger import logger
+from conf import config
 
+# Number of bytes read from a pipe each time it becomes readable
+_READ_CHUNK_SIZE = 64 * 1024
 
-def _analysis_out(pipe_result, container: list, console):
-    line = pipe_result.readline().decode("utf-8", errors="ignore").strip()
-    if not line:
-        return False
-    if console:
-        logger.info(line)
-    if line != os.linesep:
-        container.append(line)
-    return True
+# Size in bytes after which spooled output is moved from memory to a temporary file
+SPOOL_MAX_SIZE = 1024 * 1024
 
+# Exit code reported for a command killed after its timeout, the same as timeout(1)
+COMMAND_TIMEOUT_CODE = 124
 
-def command(cmds: list, input=None, cwd=None, console=True, synchronous=True):
+# Seconds a timed out process group gets between SIGTERM and SIGKILL
+_KILL_GRACE_PERIOD = 5
+
+# Seconds the pipes are still read once the command exited, output held by
+# a background process the command started is not waited for beyond that
+_DRAIN_GRACE_PERIOD = 1
+
+# Seconds between two checks whether the command exited while its pipes are open
+_EXIT_POLL_INTERVAL = 0.5
+
+
+class RetryPolicy:
     """
-    Executing shell commands
-    :param cmd_list: Command set
-    :param cwd: Directory where the command is executed
-    :returns: Result is a tuple,exp: (status code,output,err)
+    Retry policy of a command
+    :param attempts: Maximum number of executions of the command
+    :param backoff: Seconds waited before the first retry, doubled for every next retry
+    :param max_backoff: Upper limit of the wait between two retries
+    :param retry_on_exit_codes: Exit codes that are retried, any non-zero code when empty
+    """
+
+    def __init__(self, attempts=3, backoff=1, max_backoff=60, retry_on_exit_codes=None):
+        self.attempts = max(attempts, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on_exit_codes = set(retry_on_exit_codes or ())
+
+    def retryable(self, code):
+        """
+        Whether a command that exited with the code is executed again
+        """
+        if not code:
+            return False
+        return not self.retry_on_exit_codes or code in self.retry_on_exit_codes
+
+    def delays(self):
+        """
+        Seconds to wait before each retry
+        """
+        for attempt in range(self.attempts - 1):
+            yield min(self.backoff * 2 ** attempt, self.max_backoff)
+
+
+class OutputSpool:
+    """
+    Command output that is kept in memory until it grows past max_size,
+    then it is streamed into a temporary file instead of a python list
+    """
+
+    def __init__(self, max_size=SPOOL_MAX_SIZE):
+        self._file = tempfile.SpooledTemporaryFile(
+            max_size=max_size, mode="w+", encoding="utf-8"
+        )
+        self._size = 0
+
+    def append(self, line):
+        """
+        Add a line to the end of the output
+        """
+        self._size += self._file.write(line + "\n")
+
+    def __iter__(self):
+        """
+        Lazily read the output line by line
+        """
+        self._file.seek(0)
+        for line in self._file:
+            yield line.rstrip("\n")
+
+    def __len__(self):
+        return self._size
+
+    def __str__(self):
+        return self.read()
+
+    def read(self):
+        """
+        Read the whole output, exp: the same text as the not spooled output
+        """
+        return os.linesep.join(self)
+
+    def tail(self, lines=10):
+        """
+        The last lines of the output, the content is read as a stream
+        :param lines: Number of lines
+        """
+        return list(deque(self, maxlen=lines))
+
+    def close(self):
+        """
+        Close and remove the temporary file
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _decode_line(line: bytes):
+    return line.decode("utf-8", errors="ignore").strip()
+
+
+class Cassette:
+    """
+    Record every executed command (argv, cwd, exit code, stdout, stderr and the
+    duration) into a json lines file, or replay the recorded results without
+    running anything, so a gate session can be profiled offline
+    :param path: Cassette file
+    :param mode: "record" or "replay"
+    :param realtime: When replaying, wait as long as the recorded execution took
+    """
+
+    modes = ("record", "replay")
+
+    def __init__(self, path, mode, realtime=False):
+        if mode not in self.modes:
+            raise ValueError(f"Cassette mode must be one of {self.modes}: {mode}")
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self._tracks = None
+        self._lock = threading.Lock()
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    @staticmethod
+    def _key(cmds, cwd):
+        # Temporary json files passed to ccb are named after a random uuid
+        cmds = [re.sub(r"[0-9a-f]{32}", "<uuid>", str(cmd)) for cmd in cmds]
+        return json.dumps([cmds, cwd])
+
+    @staticmethod
+    def _dump(value):
+        if isinstance(value, bytes):
+            return dict(type="bytes", text=value.decode("utf-8", errors="ignore"))
+        if isinstance(value, OutputSpool):
+            return dict(type="spool", text=value.read())
+        return dict(type="str", text=value)
+
+    @staticmethod
+    def _load(value, spool):
+        if value["type"] == "bytes":
+            return value["text"].encode("utf-8")
+        if spool and value["text"] is not None:
+            output = _output_container(spool)
+            _ = [output.append(line) for line in value["text"].splitlines()]
+            return output
+        return value["text"]
+
+    def record(self, cmds, cwd, result, duration):
+        """
+        Append the result of a command to the cassette
+        """
+        code, output, error = result
+        track = dict(
+            cmds=list(cmds),
+            cwd=cwd,
+            code=code,
+            output=self._dump(output),
+            error=self._dump(error),
+            duration=round(duration, 3),
+        )
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(track) + "\n")
+
+    def _load_tracks(self):
+        self._tracks = dict()
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in filter(None, map(str.strip, file)):
+                    track = json.loads(line)
+                    self._tracks.setdefault(
+                        self._key(track["cmds"], track["cwd"]), deque()
+                    ).append(track)
+        except (IOError, json.JSONDecodeError, KeyError) as error:
+            logger.error(f"Failed to load the command cassette {self.path}: {error}")
+
+    def next_track(self, cmds, cwd):
+        """
+        The next recorded execution of a command, in the recorded order
+        """
+        with self._lock:
+            if self._tracks is None:
+                self._load_tracks()
+            tracks = self._tracks.get(self._key(cmds, cwd))
+            return tracks.popleft() if tracks else None
+
+    def replay(self, track, cmds, spool):
+        """
+        Recorded result of a command
+        """
+        if track is None:
+            message = f"Command not recorded in the cassette:{' '.join(cmds)}."
+            logger.error(message)
+            return 1, _empty_output(spool), message
+        return (
+            track["code"],
+            self._load(track["output"], spool),
+            self._load(track["error"], False),
+        )
+
+
+_cassette = None
+
+
+def _active_cassette():
+    """
+    Cassette configured by command_cassette and command_cassette_mode, if any
+    """
+    global _cassette
+    if _cassette is None and config.command_cassette and config.command_cassette_mode:
+        _cassette = Cassette(
+            config.command_cassette,
+            config.command_cassette_mode,
+            realtime=config.command_cassette_realtime,
+        )
+    return _cassette
+
+
+def _output_container(spool):
+    """
+    Container of the stdout lines, a list or an OutputSpool
+    :param spool: False, True or the size threshold of the spool
+    """
+    if not spool:
+        return []
+    return OutputSpool() if spool is True else OutputSpool(max_size=spool)
+
+
+def _empty_output(spool):
+    """
+    Output of a command which could not be run, an empty OutputSpool when spooling
+    so that callers can read it like any other output
+    """
+    return _output_container(spool) if spool else None
+
+
+def _kill_group(pipe):
+    """
+    Kill the whole process group of a command started in its own session
+    """
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(pipe.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            pipe.wait(timeout=_KILL_GRACE_PERIOD)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def _timeout_message(cmds, timeout):
+    message = f"Command timed out after {timeout}s:{' '.join(cmds)}."
+    logger.error(message)
+    return message
+
+
+def _stream_pipes(pipe, console, output, deadline=None):
+    """
+    Multiplex the stdout and stderr of the child process until both are closed,
+    or until the child exited and the pipes stayed quiet for _DRAIN_GRACE_PERIOD:
+    a background process started by the command may keep the pipes open long
+    after the command itself is done. Stdout lines are logged as soon as they arrive.
+    :param pipe: Popen object
+    :param console: Whether to print the output to the log
+    :param output: Container of the stdout lines
+    :param deadline: time.monotonic() value after which reading is abandoned
+    :returns: lines of stdout, lines of stderr and whether the deadline passed
     """
+    error = []
+    containers = {pipe.stdout: output, pipe.stderr: error}
+    remains = {pipe.stdout: b"", pipe.stderr: b""}
 
+    def _append(stream, lines):
+        for line in filter(None, map(_decode_line, lines)):
+            if console and stream is pipe.stdout:
+                logger.info(line)
+            containers[stream].append(line)
+
+    quiet_since = None
+    with selectors.DefaultSelector() as selector:
+        for stream in containers:
+            selector.register(stream, selectors.EVENT_READ)
+        while selector.get_map():
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return output, error, True
+            if quiet_since is None and pipe.poll() is not None:
+                quiet_since = now
+            if quiet_since is not None and now - quiet_since >= _DRAIN_GRACE_PERIOD:
+                break
+            # Wake up now and then to notice the exit of the child
+            timeout = _EXIT_POLL_INTERVAL if quiet_since is None else _DRAIN_GRACE_PERIOD
+            if deadline is not None:
+                timeout = min(timeout, deadline - now)
+            for key, _ in selector.select(timeout):
+                stream = key.fileobj
+                chunk = os.read(key.fd, _READ_CHUNK_SIZE)
+                if chunk:
+                    *lines, remains[stream] = (remains[stream] + chunk).split(b"\n")
+                    if quiet_since is not None:
+                        quiet_since = time.monotonic()
+                else:
+                    selector.unregister(stream)
+                    lines, remains[stream] = [remains[stream]], b""
+                _append(stream, lines)
+    for stream, remain in remains.items():
+        _append(stream, [remain])
+    return output, error, False
+
+
+def _execute(cmds, input, cwd, console, synchronous, spool, timeout):
+    """
+    Execute a command once, see command()
+    """
+    cassette = _active_cassette()
+    if cassette and cassette.replaying:
+        track = cassette.next_track(cmds, cwd)
+        if track and cassette.realtime:
+            time.sleep(track["duration"])
+        return cassette.replay(track, cmds, spool)
+    start = time.monotonic()
+    result = _spawn(cmds, input, cwd, console, synchronous, spool, timeout)
+    if cassette:
+        cassette.record(cmds, cwd, result, time.monotonic() - start)
+    return result
+
+
+def _spawn(cmds, input, cwd, console, synchronous, spool, timeout):
+    """
+    Start the command process and collect its result
+    """
     try:
         pipe = subprocess.Popen(
             cmds,
@@ -41,33 +378,270 @@ def command(cmds: list, input=None, cwd=None, console=True, synchronous=True):
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             cwd=cwd,
+            start_new_session=bool(timeout),
         )
     except FileNotFoundError:
         cmds = " ".join(cmds)
         logger.error(f"Command not found:{cmds}.")
         error = f"Command not found:{cmds}."
-        return 1, None, error
+        return 1, _empty_output(spool), error
     if input:
         pipe.stdin.write(input)
 
-    if synchronous:
-        output, error = [], []
-        while True:
-            if pipe.poll() is not None:
-                break
-            while True:
-                if not _analysis_out(pipe.stdout, output, console):
-                    break
-        if pipe.poll():
-            while True:
-                if not _analysis_out(pipe.stderr, error, console):
-                    break
-        output = os.linesep.join(output)
+    if synchronous or spool:
+        if input:
+            pipe.stdin.close()
+        deadline = time.monotonic() + timeout if timeout else None
+        output, error, timed_out = _stream_pipes(
+            pipe, console, _output_container(spool), deadline
+        )
+        if not timed_out:
+            try:
+                pipe.wait(
+                    timeout=None if deadline is None else max(deadline - time.monotonic(), 0)
+                )
+            except subprocess.TimeoutExpired:
+                timed_out = True
+        pipe.stdout.close()
+        pipe.stderr.close()
+        if timed_out:
+            _kill_group(pipe)
+            output = output if spool else os.linesep.join(output)
+            return COMMAND_TIMEOUT_CODE, output, _timeout_message(cmds, timeout)
+        # Stderr is only reported for a failed command, many tools (git, osc)
+        # write their progress information to it
+        if not pipe.returncode:
+            error = []
+        elif console:
+            _ = [logger.info(line) for line in error]
+        output = output if spool else os.linesep.join(output)
         error = os.linesep.join(error)
     else:
-        output, error = pipe.communicate()
+        try:
+            output, error = pipe.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill_group(pipe)
+            output, _ = pipe.communicate()
+            return COMMAND_TIMEOUT_CODE, output, _timeout_message(cmds, timeout)
 
     return pipe.returncode, output, error
 
 
-__all__ = ("command",)
+def command(
+    cmds: list,
+    input=None,
+    cwd=None,
+    console=True,
+    synchronous=True,
+    spool=False,
+    timeout=None,
+    retry: RetryPolicy = None,
+):
+    """
+    Executing shell commands
+    :param cmd_list: Command set
+    :param cwd: Directory where the command is executed
+    :param spool: When set, the output is returned as an OutputSpool, which moves to
+                  a temporary file after SPOOL_MAX_SIZE bytes (or the given size)
+    :param timeout: Seconds after which the process group of the command is killed,
+                    the status code is then COMMAND_TIMEOUT_CODE
+    :param retry: RetryPolicy applied to failed executions
+    :returns: Result is a tuple,exp: (status code,output,err)
+    """
+    result = _execute(cmds, input, cwd, console, synchronous, spool, timeout)
+    for delay in (retry.delays() if retry else ()):
+        if not retry.retryable(result[0]):
+            break
+        logger.warning(
+            f"Command failed with status {result[0]}, retry in {delay}s:{' '.join(cmds)}."
+        )
+        if isinstance(result[1], OutputSpool):
+            result[1].close()
+        time.sleep(delay)
+        result = _execute(cmds, input, cwd, console, synchronous, spool, timeout)
+    return result
+
+
+async def _collect_stream(stream, container: list, console):
+    """
+    Read an asyncio stream until EOF, splitting it into lines
+    """
+    remain = b""
+    while True:
+        chunk = await stream.read(_READ_CHUNK_SIZE)
+        if chunk:
+            *lines, remain = (remain + chunk).split(b"\n")
+        else:
+            lines, remain = [remain], b""
+        for line in filter(None, map(_decode_line, lines)):
+            if console:
+                logger.info(line)
+            container.append(line)
+        if not chunk:
+            break
+
+
+async def _async_wait(process, streams):
+    """
+    Wait for the command to exit, then for its output: a background process
+    the command started may keep the pipes open, they are only read for
+    _DRAIN_GRACE_PERIOD once the command exited
+    """
+    # process.wait() itself only returns once every holder closed the pipes
+    while not streams.done() and process.returncode is None:
+        await asyncio.wait({streams}, timeout=_EXIT_POLL_INTERVAL)
+    if not streams.done():
+        try:
+            await asyncio.wait_for(asyncio.shield(streams), _DRAIN_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            streams.cancel()
+            # Let go of the pipes still held by the background process
+            process._transport.close()
+    await process.wait()
+
+
+async def _async_kill_group(process):
+    """
+    Kill the whole process group of a command started in its own session
+    """
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), _KILL_GRACE_PERIOD)
+            return
+        except asyncio.TimeoutError:
+            continue
+
+
+async def _async_execute(cmds, input, cwd, console, spool, timeout):
+    """
+    Execute a command once in the event loop, see async_command()
+    """
+    cassette = _active_cassette()
+    if cassette and cassette.replaying:
+        track = cassette.next_track(cmds, cwd)
+        if track and cassette.realtime:
+            await asyncio.sleep(track["duration"])
+        return cassette.replay(track, cmds, spool)
+    start = time.monotonic()
+    result = await _async_spawn(cmds, input, cwd, console, spool, timeout)
+    if cassette:
+        cassette.record(cmds, cwd, result, time.monotonic() - start)
+    return result
+
+
+async def _async_spawn(cmds, input, cwd, console, spool, timeout):
+    """
+    Start the command process in the event loop and collect its result
+    """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmds,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            start_new_session=bool(timeout),
+        )
+    except FileNotFoundError:
+        cmds = " ".join(cmds)
+        logger.error(f"Command not found:{cmds}.")
+        error = f"Command not found:{cmds}."
+        return 1, _empty_output(spool), error
+    if input:
+        process.stdin.write(input)
+        await process.stdin.drain()
+    process.stdin.close()
+
+    output, error = _output_container(spool), []
+    streams = asyncio.gather(
+        _collect_stream(process.stdout, output, console),
+        _collect_stream(process.stderr, error, False),
+    )
+    try:
+        await asyncio.wait_for(_async_wait(process, streams), timeout)
+    except asyncio.TimeoutError:
+        streams.cancel()
+        await _async_kill_group(process)
+        process._transport.close()
+        output = output if spool else os.linesep.join(output)
+        return COMMAND_TIMEOUT_CODE, output, _timeout_message(cmds, timeout)
+    if not process.returncode:
+        error = []
+    elif console:
+        _ = [logger.info(line) for line in error]
+    output = output if spool else os.linesep.join(output)
+    return process.returncode, output, os.linesep.join(error)
+
+
+async def async_command(
+    cmds: list,
+    input=None,
+    cwd=None,
+    console=True,
+    spool=False,
+    timeout=None,
+    retry: RetryPolicy = None,
+):
+    """
+    Executing shell commands in the event loop, the result is the same as command()
+    :param cmds: Command set
+    :param input: Data sent to the stdin of the command
+    :param cwd: Directory where the command is executed
+    :param console: Whether to print the stdout of the command to the log
+    :param spool: Return the output as an OutputSpool, see command()
+    :param timeout: Seconds after which the process group of the command is killed
+    :param retry: RetryPolicy applied to failed executions
+    :returns: Result is a tuple,exp: (status code,output,err)
+    """
+    result = await _async_execute(cmds, input, cwd, console, spool, timeout)
+    for delay in (retry.delays() if retry else ()):
+        if not retry.retryable(result[0]):
+            break
+        logger.warning(
+            f"Command failed with status {result[0]}, retry in {delay}s:{' '.join(cmds)}."
+        )
+        if isinstance(result[1], OutputSpool):
+            result[1].close()
+        await asyncio.sleep(delay)
+        result = await _async_execute(cmds, input, cwd, console, spool, timeout)
+    return result
+
+
+def command_many(cmds_list: list, max_workers=None, **kwargs):
+    """
+    Execute a batch of shell commands concurrently
+    :param cmds_list: List of command sets
+    :param max_workers: Maximum number of commands running at the same time,
+                        defaults to the command_concurrency configuration
+    :param kwargs: Parameters passed to async_command() for every command
+    :returns: Results of the commands, in the same order as cmds_list
+    """
+    max_workers = max_workers or config.command_concurrency
+
+    async def _execute():
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def _limited(cmds):
+            async with semaphore:
+                return await async_command(cmds, **kwargs)
+
+        return await asyncio.gather(*(_limited(cmds) for cmds in cmds_list))
+
+    if not cmds_list:
+        return []
+    return asyncio.run(_execute())
+
+
+__all__ = (
+    "command",
+    "async_command",
+    "command_many",
+    "OutputSpool",
+    "RetryPolicy",
+    "Cassette",
+    "COMMAND_TIMEOUT_CODE",
+)
@@ -9,4 +9,70 @@
 # IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
 # PURPOSE.
 # See the Mulan PSL v2 for more details.
-# ******************************************************************************/
\ No newline at end of file
+# ******************************************************************************/
+
+# Maximum number of commands executed in parallel by command_many()
+COMMAND_CONCURRENCY = 8
+
+# Json lines file recording the executed commands, see command.Cassette
+COMMAND_CASSETTE = None
+
+# Cassette mode: record or replay
+COMMAND_CASSETTE_MODE = None
+
+# Whether a replayed command waits as long as the recorded execution
+COMMAND_CASSETTE_REALTIME = False
+
+# Maximum number of keep-alive connections kept per http host
+HTTP_POOL_MAXSIZE = 16
+
+# Maximum number of GET responses kept in memory by the response cache
+HTTP_CACHE_SIZE = 256
+
+# Whether cached GET responses are also stored under the workspace
+HTTP_CACHE_DISK = False
+
+# Seconds a cached response of each endpoint is served without revalidation,
+# once expired it is revalidated with If-None-Match/If-Modified-Since.
+# current is the read made before a write, it is always revalidated
+HTTP_CACHE_TTL = dict(
+    pull=0,
+    project_meta=60,
+    project_config=300,
+    package_meta=300,
+    project_packages=600,
+    current=0,
+)
+
+# Requests per second allowed to each host of this process, either a rate or
+# a dict of rate and burst, e.g. {"gitee.com": {"rate": 2, "burst": 10}}.
+# Hosts not listed are not limited
+HTTP_RATE_LIMITS = dict()
+
+# Consecutive failures (connect errors and 5xx) opening the circuit of a host,
+# and seconds the calls to that host then fail fast
+HTTP_CIRCUIT_BREAKER = dict(threshold=5, cooldown=60)
+
+# Seconds after which the maintainer index is stale, the first lookup past
+# them downloads it again before answering
+MAINTAINER_INDEX_TTL = 6 * 3600
+
+# Maximum number of Gitee api calls made in parallel
+GITEE_CONCURRENCY = 8
+
+# Maximum number of OBS package branches or deletions made in parallel
+OBS_CONCURRENCY = 8
+
+# Maximum number of binary packages downloaded in parallel
+DOWNLOAD_CONCURRENCY = 16
+
+# Directory of the rpm cache shared by the jobs of an agent,
+# defaults to constant.RPM_CACHE_PATH
+RPM_CACHE_DIR = None
+
+# Bytes the rpm cache may use, the least recently used rpms are evicted beyond
+RPM_CACHE_SIZE = 20 * 1024 ** 3
+
+# Seconds during which a changed progress comment is not written again,
+# the final step is always written
+COMMENT_DEBOUNCE = 0
@@ -26,11 +26,32 @@ RECORDS_COURSE = os.path.join(PROJECT_WORK_DIR, "records-course")
 # Pr Directory where the file is stored during the merge
 GIT_FETCH = os.path.join(PROJECT_WORK_DIR, "pull-fetch")
 
+# Directory of the on-disk http response cache
+HTTP_CACHE_PATH = os.path.join(PROJECT_WORK_DIR, "http-cache")
+
+# Directory of the repository to maintainer index, see api.maintainer
+MAINTAINER_INDEX_PATH = os.path.join(PROJECT_WORK_DIR, "maintainer-index")
+
+# rpm cache shared by the jobs of the agent, outside of the job workspace
+RPM_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ci-guard", "rpms")
+
 # Maximum number of retries for http requests
 STOP_MAX_ATTEMPT_NUMBER = 3
 
-# The interval to wait during retry
-WAIT_FIXED = 30
+# Seconds of the first retry backoff, doubled on every attempt and fully jittered
+RETRY_BACKOFF_BASE = 0.5
+
+# Upper bound in seconds of a single retry backoff
+RETRY_BACKOFF_MAX = 30
+
+# Upper bound in seconds of the wait asked by Retry-After or X-RateLimit-Reset
+RETRY_AFTER_MAX = 120
+
+# Seconds after which a ccb command is killed
+CCB_COMMAND_TIMEOUT = 300
+
+# Seconds after which an osc command is killed
+OSC_COMMAND_TIMEOUT = 1800
 
 # Location for saving the downloaded rpm package
 DOWNLOAD_RPM_DIR = os.path.join(PROJECT_WORK_DIR, "rpms")
@@ -87,3 +108,15 @@ max_change_effects_number = 20
 
 # max random number
 max_random_number = 15
+
+# Seconds an OBS _result long poll may be held by the server
+OBS_LONG_POLL_TIMEOUT = 600
+
+# Seconds between two OBS _result requests when long polling is not available
+OBS_POLL_INTERVAL = 5
+
+# Jobs of the OBS job history read per package, a package may have been rebuilt
+OBS_JOBHISTORY_JOBS_PER_PACKAGE = 2
+
+# Bytes read from the end of an OBS build log to check how the build ended
+BUILD_LOG_TAIL_SIZE = 16 * 1024
@@ -169,10 +169,11 @@ class ProcessRecords:
 
     def depend(self):
         build_dependeds, install_dependeds = list(), list()
-        if not self.content.get("diff_analysis"):
+        diff_analysis = self.content.get("diff_analysis")
+        if not diff_analysis:
             return build_dependeds, install_dependeds
         try:
-            for _dependeds in self.content["diff_analysis"]["effect_detail"].values():
+            for _dependeds in diff_analysis["effect_detail"].values():
                 if isinstance(_dependeds, dict):
                     build_dependeds.extend(_dependeds.get("be_build_depended", []))
                     install_dependeds.extend(_dependeds.get("be_install_depended", []))
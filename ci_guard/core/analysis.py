@@ -16,7 +16,7 @@ import re
 import random
 from json import JSONDecodeError
 from core import ProcessRecords
-from command import command
+from command import command, command_many
 from logger import logger
 from conf import config
 from constant import (
@@ -159,34 +159,31 @@ class Analysis:
 
         def _cmds(package_name):
             """
-            Executing shell Commands
+            Shell command that queries the packages depending on package_name
             Args:
                 package_name: package name
 
             Returns:
-                code: code of executing the command
-                output: Result of executing the command
-                error: error of executing the command
+                cmds: command set
             """
-            cmds = [
+            return [
                 "dnf",
                 f"--setopt=reposdir={config.workspace}",
                 "repoquery",
                 "--whatdepends",
                 package_name,
             ]
-            code, output, error = command(cmds)
-            self._record_log(code, error, package_name)
-            return code, output, error
 
         if isinstance(packages, str):
-            _, output, _ = _cmds(packages)
+            code, output, error = command(_cmds(packages))
+            self._record_log(code, error, packages)
 
             return self._analysis_depends(output)
         else:
             be_build_components, be_install_components = list(), list()
-            for package in packages:
-                _, output, _ = _cmds(package)
+            results = command_many([_cmds(package) for package in packages])
+            for package, (code, output, error) in zip(packages, results):
+                self._record_log(code, error, package)
                 be_build_dependeds, be_install_depended = self._analysis_depends(output)
                 be_build_components.extend(be_build_dependeds)
                 be_install_components.extend(be_install_depended)
@@ -30,10 +30,18 @@ from conf import config
 from .install import UnifyBuildInstallVerify
 from command import command
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from json import JSONDecodeError
 from retrying import retry
 
-from constant import GIT_FETCH, MAINLINE_PROJECT_NAMES, OS_VARIANR_MAP, OSC_CO_PATH
+from constant import (
+    CCB_COMMAND_TIMEOUT,
+    GIT_FETCH,
+    MAINLINE_PROJECT_NAMES,
+    OS_VARIANR_MAP,
+    OSC_CO_PATH,
+    OSC_COMMAND_TIMEOUT,
+)
 from exception import (
     BranchPackageError,
     CreateProjectError,
@@ -96,6 +104,67 @@ class BuildMeta(metaclass=ABCMeta):
         pass
 
 
+class ProjectSpec:
+    """
+    Full target state of an EBS test project: the build target, the specs with
+    the PR each one is built from and the build macros. A new project is
+    created with it in one ccb call, an existing one gets the specs that are
+    absent removed and the spec added in one update
+    """
+
+    # Code of ccb when the project to create already exists
+    PROJECT_EXISTS = 4013
+
+    def __init__(self, os_variant, arch, spec_branch, platform_url):
+        self.os_variant = os_variant
+        self.arch = arch
+        self.spec_branch = spec_branch
+        self.platform_url = platform_url
+        self.specs = dict()
+        self.macros = dict()
+
+    def add_spec(self, spec_name, pr_id=None):
+        """
+        Build the spec of the repository, from the pull request when pr_id is given
+        """
+        self.specs[spec_name] = pr_id
+        return self
+
+    def add_macros(self, **macros):
+        self.macros.update(macros)
+        return self
+
+    def to_dict(self, spec_type="my_specs"):
+        """
+        Content of the ccb json file
+        Args:
+            spec_type: "my_specs" to create the project with the specs,
+                       "my_specs+" to add them to an existing project
+        """
+        return {
+            "project_type": "ci_soe",
+            "spec_branch": self.spec_branch,
+            "build_targets": [
+                {"os_variant": self.os_variant, "architecture": self.arch}
+            ],
+            "users": {"admin": "maintainer"},
+            spec_type: [
+                {
+                    "spec_name": spec_name,
+                    "spec_url": f"{self.platform_url}/{config.warehouse_owner}/{spec_name}.git",
+                    "spec_branch": self.spec_branch,
+                }
+                for spec_name in self.specs
+            ],
+            "package_overrides": {
+                spec_name: {"pr_id": pr_id}
+                for spec_name, pr_id in self.specs.items()
+                if pr_id
+            },
+            "build_env_macros+": self.macros,
+        }
+
+
 class EbsBuildVerify(BuildMeta):
     """
     EBS environment builds rpm packages
@@ -201,7 +270,9 @@ class EbsBuildVerify(BuildMeta):
         Returns:
             response: After json.loads, return the data
         """
-        code, output, error = command(cmds, console=False, synchronous=False)
+        code, output, error = command(
+            cmds, console=False, synchronous=False, timeout=CCB_COMMAND_TIMEOUT
+        )
         try:
             response = json.loads(output)
             if isinstance(response, list):
@@ -264,9 +335,33 @@ class EbsBuildVerify(BuildMeta):
                 content, operate_project_cmds, _json_path
             ) as response:
                 logger.debug(f"{response.get('data') or response.get('msg')}")
+                return response
         except (TypeError, OSError, IOError, PermissionError) as error:
             raise RuntimeError(f"Failed to update project, because {error}")
 
+    def project_spec(self):
+        """
+        Target state of the test project building the pull request
+        """
+        return ProjectSpec(
+            self.os_variant, self.arch, self.target_branch, self.platform_url
+        ).add_macros(skip_check="n", runtime=21600)
+
+    def converge_project(self, spec):
+        """
+        Bring the test project to the state of the spec: it is created with it,
+        or when it already exists the packages absent from the spec are deleted
+        and its specs, overrides and macros are added with my_specs+ in one update
+        Args:
+            spec: ProjectSpec of the test project
+        """
+        content = spec.to_dict()
+        logger.info(f"PROJECT SPEC:{content}")
+        response = self.operate_package_project(content, operate="create")
+        if response.get("code") == ProjectSpec.PROJECT_EXISTS:
+            self.clear_project(keep=spec.specs)
+            self.operate_package_project(spec.to_dict(spec_type="my_specs+"))
+
     def trigger_build(self, package_name=None):
         """
         Trigger the compilation of single or all software under the project
@@ -397,22 +492,29 @@ class EbsBuildVerify(BuildMeta):
                 }
             ]
         """
-        relation_prs = list()
+        relation_prs = self.relation_pulls(pr_number, repo)
+        for package, pull in relation_prs.items():
+            # Upload the package
+            self.operate_package_project(
+                content=self.dict_data_constitute(package, pr_id=pull)
+            )
+        return list(relation_prs)
+
+    def relation_pulls(self, pr_number, repo):
+        """
+        The PRs related to the pull request whose repository exists
+        Returns:
+            relation_prs: {package: pull}
+        """
+        relation_prs = dict()
         relations = self.pull.relation_verify(pr_number, repo)
         for relation_pr in relations.get("be_link_pr", list()):
-            # Upload the package
             if not self._check_warehouse_exists(relation_pr.get("package")):
                 logger.info(
                     f"This {relation_pr.get('package')} repository does not exist"
                 )
                 continue
-            self.operate_package_project(
-                content=self.dict_data_constitute(
-                    relation_pr.get("package"),
-                    pr_id=relation_pr.get("pull"),
-                )
-            )
-            relation_prs.append(relation_pr.get("package"))
+            relation_prs[relation_pr.get("package")] = relation_pr.get("pull")
         return relation_prs
 
     def query_build_project_result(self, build_id):
@@ -535,13 +637,19 @@ class EbsBuildVerify(BuildMeta):
                 exist_packages.append(package.get(spec_type))
         return exist_packages
 
-    def clear_project(self):
+    def clear_project(self, keep=()):
         """
-        Delete all packages under the test project
+        Delete the packages under the test project
+        Args:
+            keep: packages that stay in the project
         """
-        spec_names = self.get_project_packages("spec_name")
+        spec_names = [
+            spec_name
+            for spec_name in self.get_project_packages("spec_name")
+            if spec_name not in keep
+        ]
         if not spec_names:
-            logger.info("There are no packages under this repository")
+            logger.info("There are no packages to delete under this repository")
             return
         content = {
             "my_specs-": [
@@ -600,29 +708,15 @@ class EbsBuildVerify(BuildMeta):
         # Determine if a repository exists
         if config.platform == "gitee" and not self._check_warehouse_exists(self.origin_package):
             raise RuntimeError(f"This {self.origin_package} repository does not exist")
-        logger.info("================= Create project =================")
-        self.create_project()
-        # 2. Empty the project
-        logger.info("================= Clear ebs project exist file =================")
-        self.create_project()
-        self.clear_project()
-        # 3. Upload the pr package
-        logger.info("================= Upload code =================")
-        self.operate_package_project(
-            content=self.dict_data_constitute(self.origin_package, pr_id=self.pr_num)
-        )
-        logger.info("================= Update skip_check =================")
-        content = {
-            "build_env_macros+": {
-                "skip_check": "n",
-                "runtime": 21600
-                },
-        }
-        self.operate_package_project(content)
-        # 4. Upload pr link package
-        relation_prs = self.get_relation_link(self.pr_num, self.origin_package)
+        # 2. The pr package and its linked prs replace whatever the project holds
+        spec = self.project_spec().add_spec(self.origin_package, pr_id=self.pr_num)
+        relation_prs = self.relation_pulls(self.pr_num, self.origin_package)
+        for package, pull in relation_prs.items():
+            spec.add_spec(package, pr_id=pull)
+        logger.info("================= Converge project =================")
+        self.converge_project(spec)
         logger.info("================= start build =================")
-        # 5. Triggers build
+        # 3. Triggers build
         build_id = (
             self.trigger_build()
             if relation_prs
@@ -630,10 +724,10 @@ class EbsBuildVerify(BuildMeta):
         )
         if not build_id:
             raise RuntimeError("build error")
-        # 6. Wait for the build result, wait for the build
+        # 4. Wait for the build result, wait for the build
         build_detail = self.query_build_project_result(build_id)
 
-        # 7. build the details result query
+        # 5. build the details result query
         packages_build_results = self.query_project_detail_result(
             build_detail, build_id
         )
@@ -822,13 +916,47 @@ class ObsBuildVerify(BuildMeta):
         )
         cmds = ["osc", "co", find_patch, package]
         logger.info("osc co %s %s", find_patch, package)
-        ret, _, _ = command(cmds, cwd=os.path.join(OSC_CO_PATH))
+        ret, output, _ = command(
+            cmds,
+            cwd=os.path.join(OSC_CO_PATH),
+            spool=True,
+            timeout=OSC_COMMAND_TIMEOUT,
+        )
 
         if ret:
+            logger.error(os.linesep.join(output.tail()))
             raise OscError(
                 f"Failed to get the service file of the package {package} under the {find_patch} branch"
             )
 
+    @staticmethod
+    def _fan_out(func, tasks, error_type):
+        """
+        Run the OBS operations of several packages concurrently,
+        at most config.obs_concurrency at a time
+        Args:
+            func: operation called with the keyword arguments of a task
+            tasks: {package: keyword arguments}
+            error_type: error raised by func for a failed package
+
+        Returns:
+            errors: {package: error} of the failed packages
+        """
+        if not tasks:
+            return dict()
+        with ThreadPoolExecutor(max_workers=config.obs_concurrency) as executor:
+            futures = {
+                package: executor.submit(func, **kwargs)
+                for package, kwargs in tasks.items()
+            }
+        errors = dict()
+        for package, future in futures.items():
+            try:
+                future.result()
+            except error_type as error:
+                errors[package] = error
+        return errors
+
     def branch_package(self, find_repo, package):
         """
         Branch the parent project's package to the test project
@@ -861,10 +989,17 @@ class ObsBuildVerify(BuildMeta):
 
     def delete_package_from_project(self, project, exists_packages=list()):
         """
-        Remove a specific package in a subproject
+        Remove a specific package in a subproject, a failed package does not
+        stop the others
         Args:
             project: package name
             exists_packages: Packages that already exist in the project
+
+        Returns:
+            errors: {package: DeletePackageError} of the packages that were not deleted
+
+        Raises:
+            DeletePackageError: none of the packages could be deleted
         """
         packages = self.api.get_package_info(project=project)
         if exists_packages:
@@ -873,9 +1008,13 @@ class ObsBuildVerify(BuildMeta):
                 for relation_package in exists_packages
                 if relation_package in packages[:]
             ]
-        for pkg in packages:
-            if pkg:
-                self.delete_project_package(project=project, package=pkg)
+        tasks = {pkg: dict(project=project, package=pkg) for pkg in packages if pkg}
+        errors = self._fan_out(self.delete_project_package, tasks, DeletePackageError)
+        for error in errors.values():
+            logger.error(error)
+        if errors and len(errors) == len(tasks):
+            raise DeletePackageError(f"{', '.join(errors)} delete error")
+        return errors
 
     def test_project_meta(self, find_branch, repositorys):
         """
@@ -914,50 +1053,68 @@ class ObsBuildVerify(BuildMeta):
         Returns:
             branch: branch name eg:"openEuler:Mainline"
         """
+        return self.find_repos([package]).get(package, False)
+
+    def find_repos(self, packages):
+        """
+        find the OBS branches that the packages belong to, from the package
+        listings of the branch projects
+        Args:
+            packages: package names
+
+        Returns:
+            branches: {package: branch}, packages found in no branch are left out
+        """
         obs_branch = self.p_project.branch_project(self.target_branch)
-        for branch in obs_branch:
-            if self.api.get_package_meta("info", branch, package):
-                logger.info(f"This package {package} is under the project {branch}")
-                return branch
-        return False
+        branches = self.api.package_projects(packages, obs_branch or [])
+        for package, branch in branches.items():
+            logger.info(f"This package {package} is under the project {branch}")
+        return branches
 
     def query_project_state(self, project):
         """
-        Query the build status of software packages every five seconds
+        Wait for the build of the software packages, following the state changes
         Args:
             project: project name
 
         Returns:
             project_results: Build information for all packages under the project
         """
-        package_build_statuses = ["succeeded", "failed", "unresolvable", "excluded"]
-        package_buid_result = ["building"]
-        project_results = list()
         logger.info(
             f"http://117.78.1.88/project/show/{project} Package is building, please wait......."
         )
-        while package_buid_result:
-            time.sleep(5)
-            project_results = self.api.get_project_build_state(project)
-            package_buid_result = [
-                package_result.get("result")
-                for package_result in project_results
-                if package_result.get("result") not in package_build_statuses
-            ]
+        project_results = dict()
+        for package_result in self.api.watch_project_build_state(project):
+            logger.info(
+                f"package {package_result.get('package')} {package_result.get('arch')} "
+                f"state is {package_result.get('result')}"
+            )
+            project_results[
+                (package_result.get("package"), package_result.get("arch"))
+            ] = package_result
+        # The build time of every package of an arch comes from one job history
+        build_times = {
+            arch: self.api.package_build_times(
+                project,
+                arch,
+                {
+                    package: result.get("result")
+                    for (package, _arch), result in project_results.items()
+                    if _arch == arch
+                },
+            )
+            for arch in set(arch for _, arch in project_results)
+        }
         package_build_results = list()
-        for project_result in project_results[:]:
-            # Query the build time of a package
+        for project_result in project_results.values():
             if project_result.get("result") == "excluded":
                 logger.info(
                     f"package {project_result.get('package')} state is excluded"
                 )
                 build_time = 0
             else:
-                build_time = self.api.package_build_time(
-                    project,
-                    project_result.get("arch"),
-                    project_result.get("package"),
-                    project_result.get("result"),
+                build_time = build_times[project_result.get("arch")].get(
+                    project_result.get("package")
                 )
             package_state = (
                 "success"
@@ -1084,7 +1241,11 @@ class ObsBuildVerify(BuildMeta):
             self.test_project_meta(find_branch, repositoryes),
         )
         self._put_project_config(find_branch)
-        self.delete_package_from_project(self.test_branch)
+        errors = self.delete_package_from_project(self.test_branch)
+        if errors:
+            logger.warning(
+                f"{', '.join(errors)} stay in {self.test_branch}, they could not be deleted"
+            )
         return find_branch, create_project_result
 
     def copy_pr_osc(self, origin_package, branch_name):
@@ -1120,7 +1281,9 @@ class ObsBuildVerify(BuildMeta):
             ["osc", "add", origin_package], cwd=os.path.join(OSC_CO_PATH, branch_name)
         )
         ci_code, _, ci_error = command(
-            ["osc", "ci", "-m", f"new repo {origin_package} commit"], cwd=osc_path
+            ["osc", "ci", "-m", f"new repo {origin_package} commit"],
+            cwd=osc_path,
+            timeout=OSC_COMMAND_TIMEOUT,
         )
         return ci_code, ci_error
 
@@ -1256,7 +1419,12 @@ class ObsBuildVerify(BuildMeta):
 
         logger.info("prepare environ ... ok")
 
-        co_code, _, co_error = command(["osc", "co", branch_name], cwd=OSC_CO_PATH)
+        co_code, _, co_error = command(
+            ["osc", "co", branch_name],
+            cwd=OSC_CO_PATH,
+            spool=True,
+            timeout=OSC_COMMAND_TIMEOUT,
+        )
         cp_code, cp_error = self.copy_pr_osc(origin_package, branch_name)
         osc_package_path = os.path.join(OSC_CO_PATH, branch_name, origin_package)
         _ = [
@@ -1377,10 +1545,14 @@ class ObsBuildVerify(BuildMeta):
         logger.info(f"{self.test_branch} packages: {exist_packages}")
         exist_packages.extend(relation_prs)
         exist_packages = list(set(exist_packages))
+        depend_repos = self.find_repos(
+            [depend_pkg for depend_pkg in depend_list if depend_pkg not in exist_packages]
+        )
+        branch_tasks = dict()
         for depend_pkg in depend_list[:]:
             if depend_pkg in exist_packages:
                 continue
-            find_repo = self.find_repo(depend_pkg)
+            find_repo = depend_repos.get(depend_pkg)
             if not find_repo:
                 logger.error(f"fail to find package {depend_pkg}")
                 continue
@@ -1393,15 +1565,23 @@ class ObsBuildVerify(BuildMeta):
                     f"This dependent package {depend_pkg} is in openEuler:Factory, please analyze it yourself"
                 )
                 continue
-            try:
-                self.branch_package(find_repo=find_repo, package=depend_pkg)
-            except BranchPackageError:
-                logger.error(f"branch {find_repo} {depend_pkg} failed")
+            branch_tasks[depend_pkg] = dict(find_repo=find_repo, package=depend_pkg)
+        for depend_pkg in self._fan_out(
+            self.branch_package, branch_tasks, BranchPackageError
+        ):
+            logger.error(f"branch {branch_tasks[depend_pkg]['find_repo']} {depend_pkg} failed")
         package_states = self.query_project_state(self.test_branch)
         # Checking the status of the last package build
+        failed_repos = self.find_repos(
+            [
+                package_state.get("package")
+                for package_state in package_states
+                if package_state.get("result") != "success"
+            ]
+        )
         for package_state in package_states:
             if package_state.get("result") != "success":
-                find_repo = self.find_repo(package_state.get("package"))
+                find_repo = failed_repos.get(package_state.get("package"))
                 if not find_repo or not self.api.build_package_lastlog(
                     find_repo,
                     package_state.get("package"),
@@ -1423,10 +1603,10 @@ class ObsBuildVerify(BuildMeta):
             package_build_results: Reassembled package compilation results
         """
         package_build_results = dict()
+        package_committer = self.gitee.package_committer(
+            [sig_build_result.get("package") for sig_build_result in build_results]
+        )
         for sig_build_result in build_results:
-            package_committer = self.gitee.package_committer(
-                [sig_build_result.get("package")]
-            )
             package_build_results.update(
                 {
                     sig_build_result.get("package"): {
@@ -12,19 +12,99 @@
 # ******************************************************************************/
 import os
 import os.path
+import json
+import time
 import yaml
 from pathlib import Path
+import constant
 from conf import config
 from api.gitee import Gitee
 from core import extract_repo_pull, ProcessRecords, get_test_project_name
 from logger import logger
 
 
+class ProgressComment:
+    """
+    The progress of a gate rendered into a single PR comment.
+    Every notify runs in its own process, the message of each arch and step is
+    merged into the state kept in the records directory. The comment is written
+    only when the rendered body changed and, except for the final step, when the
+    last write is older than config.comment_debounce seconds. A debounced body
+    is kept as pending without waiting, the sections it holds are part of the
+    body written by the next notify out of the debounce or by the final step
+    """
+
+    def __init__(self, repo, pr):
+        self._file = os.path.join(
+            constant.RECORDS_COURSE, f"{repo}_{pr}_progress_comment.json"
+        )
+        self._state = self._load()
+
+    def _load(self):
+        try:
+            with open(self._file, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return dict(sections=dict(), body="", posted_at=0, pending=None)
+
+    def _save(self):
+        try:
+            os.makedirs(constant.RECORDS_COURSE, exist_ok=True)
+            with open(self._file, "w", encoding="utf-8") as file:
+                json.dump(self._state, file, ensure_ascii=False)
+        except OSError as error:
+            logger.error(f"Failed to save the progress comment state: {error}")
+
+    def merge(self, arch, step, message):
+        """
+        Merge the message of the step and render the comment
+        :return: body of the comment
+        """
+        self._state["sections"].setdefault(arch, dict())[step] = message
+        self._save()
+        order = ["ci_start"] + ProcessRecords.steps
+        messages = []
+        for _arch in sorted(self._state["sections"]):
+            section = self._state["sections"][_arch]
+            steps = sorted(
+                section, key=lambda _step: order.index(_step) if _step in order else len(order)
+            )
+            messages.extend(section[_step] for _step in steps)
+        # The start message is the same for every arch
+        return (os.linesep * 2).join(dict.fromkeys(messages))
+
+    def due(self, body, final=False):
+        """
+        Whether the body has to be written now
+        """
+        if body == self._state["body"]:
+            logger.info("The progress comment is unchanged")
+            return False
+        if not final and time.time() - self._state["posted_at"] < config.comment_debounce:
+            logger.info("The progress comment was written recently, debounce it")
+            self._state["pending"] = body
+            self._save()
+            return False
+        return True
+
+    def posted(self, body):
+        """
+        Record the body that was written
+        """
+        self._state["body"] = body
+        self._state["posted_at"] = time.time()
+        self._state["pending"] = None
+        self._save()
+
+
 class Comment:
     """
     Add a comment to the specified pr
     """
 
+    # Parsed process_message.yaml, see _get_process_message
+    _process_message = None
+
     def __init__(self, pr_url, message, process, users):
         self.pr = pr_url
         self.users = users
@@ -43,61 +123,59 @@ class Comment:
         notify_users = self._add_notify_users(self.users)
         # When "message" specified, comment the "message"
         if self.message:
-            notify_message = self.message + notify_users
-        else:
-            process_message = self._get_process_message()
-            if self.process:
-                notify_message = process_message.get(self.process)
-            else:
-                result_file_instance = self._get_current_process_from_file()
-                current_result = result_file_instance.progress
-                current_process = current_result.get("current_progress")
-                notify_message = (
-                    process_message.get(current_process) if current_process else ""
-                )
-                build_host = f"{config.build_host}/project/show/{get_test_project_name(config.repo, config.pr)}"
-                install_host = f"http://{config.files_server}/src-openeuler/{config.branch}/{config.committer}/{config.repo}/{config.arch}/{config.pr}/{self.comment}/"
-                if current_process == "single_build_check":
-                    notify_message["message"] = notify_message["message"] % (
-                        config.arch,
-                        build_host,
-                    )
-                elif current_process == "single_install_check":
-                    notify_message["message"] = notify_message["message"] % (
-                        config.arch,
-                        install_host,
-                    )
-                elif current_process == "diff_analysis":
-                    _build, _install = result_file_instance.depend()
-                    notify_message["message"] = notify_message["message"] % (
-                        config.arch,
-                        len(_build),
-                        len(_install),
-                        build_host,
-                    )
-                elif current_process in ["multi_build_check", "multi_install_check"]:
-                    process = (
-                        "build" if current_process == "multi_build_check" else "install"
-                    )
-                    log_url = build_host if current_process == "multi_build_check" else install_host
-                    success_num, fail_num = result_file_instance.multi_check(process)
-                    notify_message["message"] = notify_message["message"] % (
-                        config.arch,
-                        success_num,
-                        fail_num,
-                        log_url,
-                    )
-            notify_message = (
-                notify_message["message"] + notify_users if notify_message else ""
-            )
+            self._write_comment(self.message + notify_users)
+            return
+        step, notify_message, final = self._progress_message()
+        if not notify_message:
+            logger.warning("Add comment content is empty")
+            return
+        progress_comment = ProgressComment(self.repo_name, self.pr_num)
+        body = progress_comment.merge(config.arch, step, notify_message) + notify_users
+        if not progress_comment.due(body, final):
+            return
+        self._write_comment(body)
+        progress_comment.posted(body)
 
-        if notify_message:
-            if not config.process_comment_id:
-                self._add_comment_to_pr(notify_message, choice=True)
-            else:
-                self._modify_comment_to_pr(notify_message, config.process_comment_id)
+    def _write_comment(self, message):
+        """
+        Create the progress comment or modify it once it exists
+        """
+        if not config.process_comment_id:
+            self._add_comment_to_pr(message, choice=True)
         else:
-            logger.warning("Add comment content is empty")
+            self._modify_comment_to_pr(message, config.process_comment_id)
+
+    def _progress_message(self):
+        """
+        Message of the given process, or of the current process of the result file
+        :return: process, message, whether it is the final process
+        """
+        process_message = self._get_process_message()
+        if self.process:
+            message = process_message.get(self.process, dict()).get("message")
+            return self.process, message, self.process == ProcessRecords.steps[-1]
+        result_file_instance = self._get_current_process_from_file()
+        progress = result_file_instance.progress
+        current_process = progress.get("current_progress")
+        final = not progress.get("next_progress")
+        template = process_message.get(current_process, dict()).get("message")
+        if not template:
+            return current_process, None, final
+        build_host = f"{config.build_host}/project/show/{get_test_project_name(config.repo, config.pr)}"
+        install_host = f"http://{config.files_server}/src-openeuler/{config.branch}/{config.committer}/{config.repo}/{config.arch}/{config.pr}/{self.comment}/"
+        if current_process == "single_build_check":
+            template = template % (config.arch, build_host)
+        elif current_process == "single_install_check":
+            template = template % (config.arch, install_host)
+        elif current_process == "diff_analysis":
+            _build, _install = result_file_instance.depend()
+            template = template % (config.arch, len(_build), len(_install), build_host)
+        elif current_process in ["multi_build_check", "multi_install_check"]:
+            process = "build" if current_process == "multi_build_check" else "install"
+            log_url = build_host if current_process == "multi_build_check" else install_host
+            success_num, fail_num = result_file_instance.multi_check(process)
+            template = template % (config.arch, success_num, fail_num, log_url)
+        return current_process, template, final
 
     @staticmethod
     def _add_notify_users(users):
@@ -146,17 +224,20 @@ class Comment:
 
     def _get_process_message(self):
         """
-        Parse the echo information configuration file of the execution process
+        Parse the echo information configuration file of the execution process,
+        it is parsed once and shared by every comment
         :return: information of the execution process(dict)
         """
+        if Comment._process_message is not None:
+            return Comment._process_message
         current_path = os.path.dirname(os.path.relpath(__file__))
         message_file = os.path.join(
             os.path.dirname(current_path), "conf/process_message.yaml"
         )
         try:
             with open(message_file, "r", encoding="utf-8") as msg_file:
-                process_message = yaml.safe_load(msg_file)
-                return process_message
+                Comment._process_message = yaml.safe_load(msg_file) or dict()
+                return Comment._process_message
         except yaml.YAMLError as error:
             logger.error(f"Parsing file process_message.yaml failed: {error}")
             return dict()
@@ -15,7 +15,7 @@
 import time
 import uuid
 import json
-from constant import STOP_MAX_ATTEMPT_NUMBER
+from constant import STOP_MAX_ATTEMPT_NUMBER, CCB_COMMAND_TIMEOUT
 from logger import logger
 from pathlib import Path
 from command import command
@@ -110,7 +110,9 @@ class MakeHotPatchProject:
         Returns:
             response: After json.loads, return the data
         """
-        code, output, error = command(cmds, console=False, synchronous=False)
+        code, output, error = command(
+            cmds, console=False, synchronous=False, timeout=CCB_COMMAND_TIMEOUT
+        )
         try:
             response = json.loads(output)
             if isinstance(response, list):
@@ -302,11 +304,9 @@ class MakeHotPatchProject:
     def comment_tag(self, build_details):
         result_list = [0 if result == "success" else 1 for arch, result in build_details.items()]
         if sum(result_list) == 0:
-            self.gitee.remove_tag(self.pull_request, "ci_failed")
-            self.gitee.create_tag(self.pull_request, "ci_successful")
+            self.gitee.reconcile_labels(self.pull_request, ["ci_successful"], ["ci_failed"])
         else:
-            self.gitee.remove_tag(self.pull_request, "ci_successful")
-            self.gitee.create_tag(self.pull_request, "ci_failed")
+            self.gitee.reconcile_labels(self.pull_request, ["ci_failed"], ["ci_successful"])
 
     @retry(retry_on_result=lambda result: result is False,
            stop_max_attempt_number=STOP_MAX_ATTEMPT_NUMBER,
@@ -15,9 +15,10 @@ import json
 import re
 import yaml
 from pathlib import Path
+from api.build_env import OpenBuildService
 from api.gitee import Gitee
 from logger import logger
-from command import command
+from command import command, command_many, RetryPolicy
 from core import (
     extract_repo_pull,
     get_test_project_name,
@@ -29,6 +30,10 @@ from conf import config
 from .pull_link import Pull
 
 
+# ccb queries are retried quickly instead of waiting on a stuck builder
+CCB_QUERY_RETRY = RetryPolicy(attempts=3, backoff=2)
+
+
 class InstallBase:
     """
     EBS or OBS software package installation check
@@ -72,6 +77,25 @@ class InstallBase:
             logger.error(f"Json load error: {error}")
             raise ValueError(error)
 
+    @staticmethod
+    def record_repo_rpms(package, rpms):
+        """
+        Record the rpm names of the downloaded binaries of a repo, read by repo_rpm_map()
+        :param package: repo name
+        :param rpms: file names of the rpm packages
+        """
+        install_logs = os.path.join(constant.PROJECT_WORK_DIR, "install-logs")
+        try:
+            os.makedirs(install_logs, exist_ok=True)
+            with open(
+                os.path.join(install_logs, "repo-rpm-map"), "a", encoding="utf-8"
+            ) as file:
+                for rpm in rpms:
+                    # Drop the version-release.arch.rpm of the file name
+                    file.write(f"{package}:{rpm.rsplit('-', 2)[0]}{os.linesep}")
+        except IOError as error:
+            logger.error(f"Failed to record the rpms of {package}: {error}.")
+
     @staticmethod
     def repo_rpm_map():
         """
@@ -167,14 +191,10 @@ class InstallBase:
 
         installed_failed_rpms = dict()
         repo_rpm_map = self.repo_rpm_map()
+        commitors = Gitee(repo=self._repo).package_committer(archive_rpms)
         for package in archive_rpms:
-            gitee_api = Gitee(repo=package)
             binary_rpms = repo_rpm_map.get(package, set())
             status = "success" if not binary_rpms.intersection(failed) else "failed"
-            commitor = gitee_api.package_committer(
-                package_names=[package],
-                gitee_branch=self._target_branch,
-            )
             if status == "failed":
                 installed_failed_rpms[package] = False if package in rpms else True
             logger.info(
@@ -184,7 +204,7 @@ class InstallBase:
                 install_result=status,
                 sig=None,
                 log_url=self.log,
-                commitor=commitor.get(package),
+                commitor=commitors.get(package),
             )
         if self._record(installed_result, "multi_install_check"):
             logger.info("The multi package installation check succeeded.")
@@ -246,11 +266,11 @@ class InstallBase:
         for package, is_archive in rpms.items():
             if is_archive:
                 code, _, _ = command(
-                    ["bash", self.install_cmds, "isolation_verify", package]
+                    ["bash", self.install_cmds, "isolation_verify", package], spool=True
                 )
             else:
                 cmds = f"bash {self.install_cmds} isolation_verify {constant.DOWNLOAD_RPM_DIR} {package}"
-                code, _, _ = command(cmds.split())
+                code, _, _ = command(cmds.split(), spool=True)
             verify_result[package] = False if code else True
 
             if code:
@@ -323,7 +343,7 @@ class InstallBase:
                 )
                 cmds = ["bash", self.install_cmds, "install_rpms"]
                 cmds.extend(list(archive_rpms))
-                command(cmds=cmds)
+                command(cmds=cmds, spool=True)
                 logger.info("The archive binary package installation is complete.")
         else:
             link_pulls = self._link_pull()
@@ -344,7 +364,8 @@ class InstallBase:
                     "install_rpms",
                     constant.DOWNLOAD_RPM_DIR,
                     self.platform_tail,
-                ]
+                ],
+                spool=True,
             )
         # Single package installation, then directly check the results and update
         if not multiple:
@@ -405,25 +426,38 @@ class InstallVerify(InstallBase):
 
     def _download_rpms(self, download_rpms: list):
         """
-        Download archived or compiled binaries using the OSC
+        Download the compiled binaries of the test projects from OBS,
+        the rpms of all the packages are downloaded at the same time
         :param download_rpms: Rpm to be downloaded
         """
         rpms = {
             repo: get_test_project_name(repo, pull)
             for repo, pull in download_rpms.items()
         }
-
-        os.makedirs(constant.DOWNLOAD_RPM_DIR, exist_ok=True)
+        obs = OpenBuildService()
+        binarys = dict()
         for package, project in rpms.items():
-            cmds = f"bash {self.install_cmds} download_binarys {project} {package} {self.repository} {self._arch}"
-            code, _, error = command(
-                cmds=cmds.split(),
-                cwd=constant.DOWNLOAD_RPM_DIR,
+            binarys[package] = obs.package_binarys(
+                project, package, self.repository, self._arch
             )
-
-            if code:
+            if binarys[package] is None:
                 logger.warning(
-                    f"Failed to download the rpm package,project: {project} package: {package} error detail: {error}."
+                    f"Failed to list the rpm package,project: {project} package: {package}."
+                )
+        paths = obs.download_binarys(
+            [binary for package_binarys in binarys.values() for binary in package_binarys or []],
+            constant.DOWNLOAD_RPM_DIR,
+        )
+        for package, package_binarys in binarys.items():
+            downloaded = [
+                binary["filename"]
+                for binary in package_binarys or []
+                if paths.get(binary["filename"])
+            ]
+            self.record_repo_rpms(package, downloaded)
+            if len(downloaded) != len(package_binarys or []):
+                logger.warning(
+                    f"Failed to download the rpm package,project: {rpms[package]} package: {package}."
                 )
 
 
@@ -444,10 +478,19 @@ class UnifyBuildInstallVerify(InstallBase):
 
     def _get_repos(self, repo_ids):
         repos = dict()
-        for repo_id in repo_ids:
-            cmds = f"ccb select rpm_repos repo_id={repo_id} architecture={self._arch} -f rpm_repo_path"
-            code, cmd_out, error = command(cmds=cmds.split(), console=False)
+        cmds_list = [
+            f"ccb select rpm_repos repo_id={repo_id} architecture={self._arch} -f rpm_repo_path".split()
+            for repo_id in repo_ids
+        ]
+        results = command_many(
+            cmds_list,
+            console=False,
+            timeout=constant.CCB_COMMAND_TIMEOUT,
+            retry=CCB_QUERY_RETRY,
+        )
+        for repo_id, cmds, (code, cmd_out, error) in zip(repo_ids, cmds_list, results):
             if code:
+                cmds = " ".join(cmds)
                 logger.error(
                     f"Failed to get the project repo source,command: {cmds} error: {error}"
                 )
@@ -458,7 +501,12 @@ class UnifyBuildInstallVerify(InstallBase):
 
     def _get_emsx(self, project):
         cmds = f"ccb select projects os_project={project}"
-        code, cmd_out, error = command(cmds=cmds.split(), console=False)
+        code, cmd_out, error = command(
+            cmds=cmds.split(),
+            console=False,
+            timeout=constant.CCB_COMMAND_TIMEOUT,
+            retry=CCB_QUERY_RETRY,
+        )
         if code:
             logger.error(
                 f"Failed to get the project info,command: {cmds} error: {error}"
@@ -485,7 +533,12 @@ class UnifyBuildInstallVerify(InstallBase):
         ground_project_repo = {}
         cmds = f"ccb select builds build_id={build_id} -f repo_id,ground_projects"
         logger.info(cmds)
-        code, out, error = command(cmds=cmds.split(), console=False)
+        code, out, error = command(
+            cmds=cmds.split(),
+            console=False,
+            timeout=constant.CCB_COMMAND_TIMEOUT,
+            retry=CCB_QUERY_RETRY,
+        )
         if code:
             logger.error(f"Failed to get the repo id,command: {cmds} error: {error}.")
             raise ValueError()
@@ -569,12 +622,15 @@ gpgcheck=0
         :param download_rpms: Rpm to be downloaded
         """
         os.makedirs(constant.DOWNLOAD_RPM_DIR, exist_ok=True)
-        for package, _ in download_rpms.items():
-            cmds = f"bash {self.install_cmds} ccb_download_binarys {self.project} {package} {self._arch}"
-            code, _, error = command(
-                cmds=cmds.split(),
-                cwd=constant.DOWNLOAD_RPM_DIR,
-            )
+        packages = list(download_rpms.keys())
+        results = command_many(
+            [
+                f"bash {self.install_cmds} ccb_download_binarys {self.project} {package} {self._arch}".split()
+                for package in packages
+            ],
+            cwd=constant.DOWNLOAD_RPM_DIR,
+        )
+        for package, (code, _, error) in zip(packages, results):
             if code:
                 logger.warning(
                     f"Failed to download the rpm package,project: {self.project} package: {package} error detail: {error}."
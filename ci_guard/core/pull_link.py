@@ -13,20 +13,95 @@
 import os
 import shutil
 import datetime
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import retrying
 from retrying import retry, RetryError
 from core import extract_repo_pull
 from core.analysis import Analysis
 from pyrpm.spec import Spec, replace_macros
-from constant import STOP_MAX_ATTEMPT_NUMBER, WAIT_FIXED, GIT_FETCH
+from constant import STOP_MAX_ATTEMPT_NUMBER, GIT_FETCH
 from api.gitee import Gitee
+from api.backoff import Backoff
+from exception import RequestError
 from sql import Mysql
 from logger import logger
 from command import command
 from conf import config
 
 
+class PullStates:
+    """
+    State of many PRs resolved at once and cached for the rest of the gate run.
+    PRs are fetched concurrently, the PRs of a repository linked
+    PULL_LIST_THRESHOLD times or more are looked up in its pull list instead
+    """
+
+    PULL_LIST_THRESHOLD = 5
+    # Pulls listed before the remaining PRs are fetched one by one
+    PULL_LIST_SIZE = 300
+
+    _states = dict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _single_state(repo, number):
+        pr_info = Gitee(repo=repo).get_single_pr_info(number=number)
+        return {(repo, number): pr_info.get("state") if pr_info else None}
+
+    @staticmethod
+    def _listed_states(repo, numbers):
+        states = dict()
+        pulls = Gitee(repo=repo).iter_pulls()
+        try:
+            for pull in itertools.islice(pulls, PullStates.PULL_LIST_SIZE):
+                if str(pull.get("number")) in numbers:
+                    states[(repo, str(pull["number"]))] = pull.get("state")
+                    if len(states) == len(numbers):
+                        break
+        except RequestError as error:
+            # The PRs not listed yet are fetched one by one
+            logger.warning(error)
+        pulls.close()
+        for number in numbers.difference(number for _, number in states):
+            states.update(PullStates._single_state(repo, number))
+        return states
+
+    @classmethod
+    def resolve(cls, pulls):
+        """
+        State of the PRs
+        :param pulls: [(repo, number)]
+        :return: {(repo, str(number)): state}, the state is None when the PR was not found
+        """
+        pulls = set((repo, str(number)) for repo, number in pulls)
+        with cls._lock:
+            states = {pull: cls._states[pull] for pull in pulls if pull in cls._states}
+        repos = dict()
+        for repo, number in pulls.difference(states):
+            repos.setdefault(repo, set()).add(number)
+        if repos:
+            with ThreadPoolExecutor(max_workers=config.gitee_concurrency) as executor:
+                futures = []
+                for repo, numbers in repos.items():
+                    if len(numbers) >= cls.PULL_LIST_THRESHOLD:
+                        futures.append(executor.submit(cls._listed_states, repo, numbers))
+                    else:
+                        futures.extend(
+                            executor.submit(cls._single_state, repo, number)
+                            for number in numbers
+                        )
+                for future in futures:
+                    states.update(future.result())
+            with cls._lock:
+                cls._states.update(
+                    (pull, state) for pull, state in states.items() if state is not None
+                )
+        return states
+
+
 class Pull:
     """
     Pr Relationship verification
@@ -278,23 +353,25 @@ class Pull:
             logger.info(f"This PR is no correlation relationship: {pr_number}")
             return relations
 
+        links = []
         for pr_link_info in link_prs:
             if (
                 pr_link_info["source_pr"] == pr_number
                 and pr_link_info["source_repo"] == repo
             ):
-                number = pr_link_info["link_pr"]
-                repo = pr_link_info["link_repo"]
-                link = "link_pr"
+                links.append(
+                    ("link_pr", pr_link_info["link_repo"], pr_link_info["link_pr"])
+                )
             else:
-                number = pr_link_info["source_pr"]
-                repo = pr_link_info["source_repo"]
-                link = "be_link_pr"
-            pr_info = Gitee(repo=repo).get_single_pr_info(number=number)
+                links.append(
+                    ("be_link_pr", pr_link_info["source_repo"], pr_link_info["source_pr"])
+                )
+        states = PullStates.resolve([(link_repo, number) for _, link_repo, number in links])
+        for link, link_repo, number in links:
             relations[link].append(
                 {
-                    "status": pr_info.get("state") if pr_info else "unknow",
-                    "package": repo,
+                    "status": states.get((link_repo, str(number))) or "unknow",
+                    "package": link_repo,
                     "pull": number,
                 }
             )
@@ -324,7 +401,7 @@ class Pull:
     @retry(
         retry_on_result=lambda result: result is False,
         stop_max_attempt_number=STOP_MAX_ATTEMPT_NUMBER,
-        wait_fixed=WAIT_FIXED,
+        wait_func=Backoff(),
     )
     def fetch_pull(self, url, pr_number, repo, depth=1):
         """
@@ -341,7 +418,7 @@ class Pull:
             logger.warning(f"Makedirs permission error: {GIT_FETCH}")
             return None
         if not os.path.exists(os.path.join(GIT_FETCH, repo)):
-            command(cmds=["git", "clone", url], cwd=GIT_FETCH)
+            command(cmds=["git", "clone", url], cwd=GIT_FETCH, spool=True)
         fetch = f"+refs/pull/{pr_number}/MERGE:refs/pull/{pr_number}/MERGE"
         code, _, error = command(
             ["git", "fetch", "--depth", str(depth), url, fetch],
@@ -406,18 +483,19 @@ class Pull:
         """
         Link pull merged
         """
-        tags = Gitee(repo=repo).get_all_tag(
-            pr_number=pr_number, body=dict(page=1, per_page=100)
-        )
-        if not tags:
+        merge_tags = set(self.merge_tags.split(","))
+        exist_tags = set()
+        try:
+            for tag in Gitee(repo=repo).iter_labels(pr_number):
+                exist_tags.add(tag.get("name"))
+                if exist_tags.issuperset(merge_tags) and "linkpull" in exist_tags:
+                    break
+        except RequestError as error:
+            logger.error(f"Failed to get the labels of {repo} {pr_number}: {error}")
             return
-        exist_tags = [tag.get("name") for tag in tags]
         if "linkpull" not in exist_tags:
             return
-        exist_tags.remove("linkpull")
-        miss_tags = set(self.merge_tags.split(",")).difference(
-            set(filter(lambda tag: tag in self.merge_tags, exist_tags))
-        )
+        miss_tags = merge_tags.difference(exist_tags)
         state = None if miss_tags else self.merge_tags
         try:
             update_state = self._update_merge_flag(repo, pr_number, state)
@@ -256,8 +256,9 @@ class VerifyHotPatchMeta:
                 file.write("modify_version:%s\n" % " ".join(changed_version_list))
         else:
             if only_status_changed:
-                self.gitee.remove_tag(self.pull_request, "ci_processing")
-                self.gitee.create_tag(self.pull_request, "ci_successful")
+                self.gitee.reconcile_labels(
+                    self.pull_request, ["ci_successful"], ["ci_processing"]
+                )
                 logger.warning("only status is modify, don't need make hotpatch")
 
         checkout_cmd = ["git", "checkout", f"pr_{self.pull_request}"]
@@ -286,14 +287,13 @@ class VerifyHotPatchMeta:
         body_str = "热补丁制作流程已中止，错误信息：%s" % err_info
         logger.error(err_info)
         self.gitee.create_pr_comment(self.pull_request, body_str)
-        self.gitee.remove_tag(self.pull_request, "ci_processing")
-        self.gitee.create_tag(self.pull_request, "ci_failed")
+        self.gitee.reconcile_labels(self.pull_request, ["ci_failed"], ["ci_processing"])
         return -1
 
     def verify(self):
-        self.gitee.remove_tag(self.pull_request, "ci_successful")
-        self.gitee.remove_tag(self.pull_request, "ci_failed")
-        self.gitee.create_tag(self.pull_request, "ci_processing")
+        self.gitee.reconcile_labels(
+            self.pull_request, ["ci_processing"], ["ci_successful", "ci_failed"]
+        )
         result = self.get_update_info()
         if result == 0:
             sys.exit(0)